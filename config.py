@@ -1,2 +1,3 @@
 chunk_size = 500
-overlap_size = 200 #should increase latter 
\ No newline at end of file
+overlap_size = 200 #should increase latter 
+chunking_strategy = "character" # character | token | sentence | parent_child
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import AsyncIterator, Dict, Iterator, List
 import os
 from dotenv import load_dotenv
 from google import genai
@@ -18,10 +18,14 @@ class AnswerBeautifier:
         model_name: str = "gemini-2.5-flash",
         temperature: float = 0.2,
         max_output_tokens: int = 512,
+        llm_client=None,
     ):
         self.model_name = model_name
         self.temperature = temperature
         self.max_output_tokens = max_output_tokens
+        # anything exposing client.models / client.aio.models
+        # generate_content(_stream) works, e.g. a local fake in tests
+        self.client = llm_client or client
 
     def generate_answer(
         self, question: str, top_documents: List[Dict]
@@ -33,13 +37,10 @@ class AnswerBeautifier:
 
         prompt = self._build_prompt(question, context)
 
-        response = client.models.generate_content(
+        response = self.client.models.generate_content(
             model=self.model_name,
             contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=self.temperature,
-                max_output_tokens=self.max_output_tokens,
-            ),
+            config=self._generation_config(),
         )
 
         return {
@@ -47,6 +48,83 @@ class AnswerBeautifier:
             "sources": sources,
         }
 
+    async def agenerate_answer(
+        self, question: str, top_documents: List[Dict]
+    ) -> Dict:
+        """
+        Async generate_answer: awaits Gemini through the client's aio API
+        instead of blocking a worker thread on the HTTP call.
+        """
+        context = self._merge_context(top_documents)
+
+        sources = self._collect_sources(top_documents)
+
+        prompt = self._build_prompt(question, context)
+
+        response = await self.client.aio.models.generate_content(
+            model=self.model_name,
+            contents=prompt,
+            config=self._generation_config(),
+        )
+
+        return {
+            "answer": response.text.strip(),
+            "sources": sources,
+        }
+
+    def stream_answer(
+        self, question: str, top_documents: List[Dict]
+    ) -> Iterator[Dict]:
+        """
+        Streaming variant of generate_answer.
+        Yields {"sources": [...]} first (known before generation starts),
+        then {"delta": "..."} for every piece of text the model returns.
+        """
+        context = self._merge_context(top_documents)
+
+        yield {"sources": self._collect_sources(top_documents)}
+
+        prompt = self._build_prompt(question, context)
+
+        stream = self.client.models.generate_content_stream(
+            model=self.model_name,
+            contents=prompt,
+            config=self._generation_config(),
+        )
+
+        for chunk in stream:
+            if chunk.text:
+                yield {"delta": chunk.text}
+
+    async def astream_answer(
+        self, question: str, top_documents: List[Dict]
+    ) -> AsyncIterator[Dict]:
+        """
+        Async stream_answer, same events. Reads the stream through the
+        client's aio API, so an ASGI server can send each piece on arrival.
+        """
+        context = self._merge_context(top_documents)
+
+        yield {"sources": self._collect_sources(top_documents)}
+
+        prompt = self._build_prompt(question, context)
+
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=prompt,
+            config=self._generation_config(),
+        )
+
+        async for chunk in stream:
+            if chunk.text:
+                yield {"delta": chunk.text}
+
+    def _generation_config(self) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            temperature=self.temperature,
+            max_output_tokens=self.max_output_tokens,
+        )
+
     def _merge_context(self, documents: List[Dict]) -> str:
         """
         Merge multiple chunks into a single clean context
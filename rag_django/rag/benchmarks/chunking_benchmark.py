@@ -0,0 +1,132 @@
+"""
+Compare chunking strategies on a fixed corpus.
+
+For every strategy the corpus is ingested into a throw-away Chroma store
+and we report: number of chunks, embedding time, index size on disk and
+retrieval hit rate (share of sampled sentences whose source page is in the
+top_k results).
+
+Run from rag_django/:
+    python -m rag.benchmarks.chunking_benchmark --data rag/data
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+from rag.data_ingestor.ingestion import FolderPDFIngestor
+from rag.data_ingestor.parsing import PDFParser
+from rag.retriever.retriever import ChromaRetriever
+from rag.retriever.score_cache import RerankScoreCache
+
+# (chunk_size, chunk_overlap) per strategy; token sizes are in tokens
+DEFAULT_SETTINGS = {
+    "character": (500, 200),
+    "token": (128, 32),
+    "sentence": (500, 100),
+    "parent_child": (500, 0),
+}
+
+
+def sample_queries(folder: str, count: int, seed: int = 0) -> List[Dict]:
+    """Deterministic set of (sentence, source, page) probes from the corpus."""
+    rng = random.Random(seed)
+    parser = PDFParser()
+    candidates = []
+
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        pages, _ = parser.load_pdf(os.path.join(folder, name))
+        for page in pages:
+            for sentence in re.split(r"(?<=[.!?])\s+", page["text"]):
+                sentence = " ".join(sentence.split())
+                if 60 <= len(sentence) <= 300:
+                    candidates.append({"query": sentence, "source": name, "page": page["page"]})
+
+    rng.shuffle(candidates)
+    return candidates[:count]
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+def run_strategy(folder: str, strategy: str, queries: List[Dict], top_k: int) -> Dict:
+    chunk_size, chunk_overlap = DEFAULT_SETTINGS[strategy]
+    chroma_dir = tempfile.mkdtemp(prefix=f"chunk_bench_{strategy}_")
+
+    try:
+        ingestor = FolderPDFIngestor(
+            folder_path=folder,
+            chroma_dir=chroma_dir,
+            collection_name="bench",
+            chunking_strategy=strategy,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            embedding_cache_path="",  # time real forward passes
+        )
+        start = time.perf_counter()
+        result = ingestor.ingest()
+        ingest_seconds = time.perf_counter() - start
+
+        retriever = ChromaRetriever(
+            chroma_dir=chroma_dir,
+            collection_name="bench",
+            score_cache=RerankScoreCache(),
+        )
+        results = retriever.retrieve_many(
+            [q["query"] for q in queries], top_k=top_k, content_type="text"
+        )
+        hits = sum(
+            1
+            for probe, found in zip(queries, results)
+            if any(
+                r["metadata"].get("source") == probe["source"]
+                and r["metadata"].get("page") == probe["page"]
+                for r in found
+            )
+        )
+
+        return {
+            "strategy": strategy,
+            "chunks": result.get("chunks", 0),
+            "embed_seconds": result["timings"]["embed_seconds"],
+            "ingest_seconds": ingest_seconds,
+            "index_bytes": directory_size(chroma_dir),
+            "hit_rate": hits / len(queries) if queries else 0.0,
+        }
+    finally:
+        shutil.rmtree(chroma_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=os.path.join("rag", "data"))
+    parser.add_argument("--strategies", nargs="+", default=list(DEFAULT_SETTINGS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    queries = sample_queries(args.data, args.queries)
+    print(f"corpus={args.data} probes={len(queries)} top_k={args.top_k}\n")
+    print(f"{'strategy':<14}{'chunks':>8}{'embed s':>10}{'ingest s':>10}{'index MB':>10}{'hit rate':>10}")
+
+    for strategy in args.strategies:
+        row = run_strategy(args.data, strategy, queries, args.top_k)
+        print(
+            f"{row['strategy']:<14}{row['chunks']:>8}{row['embed_seconds']:>10.1f}"
+            f"{row['ingest_seconds']:>10.1f}{row['index_bytes'] / 1e6:>10.1f}{row['hit_rate']:>10.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Compare inference backends (see rag.inference.registry) against fp32.
+
+For every backend the embedding model and the cross-encoder are loaded
+fresh and we report:
+  - query latency: p50/p95 of single-query encode calls
+  - throughput: chunks/sec embedding the corpus in batches
+  - embedding agreement: mean cosine between the backend's and fp32 vectors
+  - retrieval agreement: overlap of the dense top_k with fp32's top_k
+  - rerank agreement: overlap of the cross-encoder top_k with fp32's, and
+    rerank pairs/sec
+
+Run from rag_django/:
+    python -m rag.benchmarks.inference_benchmark --data rag/data
+"""
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from rag.benchmarks.chunking_benchmark import sample_queries
+from rag.data_ingestor.parsing import PDFParser
+from rag.inference.registry import (
+    EMBEDDING_MODEL_NAME,
+    INFERENCE_BACKENDS,
+    RERANKER_MODEL_NAME,
+    load_cross_encoder,
+    load_embedding_model,
+)
+
+
+def load_chunks(folder: str, limit: int) -> List[str]:
+    parser = PDFParser()
+    chunks = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        for record in parser.parse(os.path.join(folder, name)):
+            chunks.append(record["content"])
+            if len(chunks) >= limit:
+                return chunks
+    return chunks
+
+
+def top_k_overlap(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    """Mean |top_k(a) & top_k(b)| / k over rows."""
+    top_a = np.argsort(-a, axis=1)[:, :k]
+    top_b = np.argsort(-b, axis=1)[:, :k]
+    return float(np.mean([
+        len(set(x) & set(y)) / k for x, y in zip(top_a, top_b)
+    ]))
+
+
+def run_backend(
+    backend: str,
+    queries: List[str],
+    chunks: List[str],
+    batch_size: int,
+    top_k: int,
+    rerank_candidates: int,
+) -> Dict:
+    embedder = load_embedding_model(EMBEDDING_MODEL_NAME, backend)
+    cross_encoder = load_cross_encoder(RERANKER_MODEL_NAME, backend)
+
+    # warm up, the first call pays for lazy initialisation
+    embedder.encode(queries[:1], normalize_embeddings=True)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedder.encode([query], normalize_embeddings=True)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    chunk_vectors = embedder.encode(
+        chunks, batch_size=batch_size, normalize_embeddings=True
+    )
+    embed_seconds = time.perf_counter() - start
+    query_vectors = embedder.encode(queries, normalize_embeddings=True)
+
+    # rerank a fixed candidate list per query so every backend scores the
+    # same pairs; the candidates are just the first chunks
+    candidates = chunks[:rerank_candidates]
+    pairs = [(q, c) for q in queries for c in candidates]
+    start = time.perf_counter()
+    scores = cross_encoder.predict(pairs, batch_size=batch_size)
+    rerank_seconds = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "chunks_per_sec": len(chunks) / embed_seconds if embed_seconds else 0.0,
+        "pairs_per_sec": len(pairs) / rerank_seconds if rerank_seconds else 0.0,
+        "chunk_vectors": np.asarray(chunk_vectors),
+        "query_vectors": np.asarray(query_vectors),
+        "rerank_scores": np.asarray(scores).reshape(len(queries), len(candidates)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=os.path.join("rag", "data"))
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS))
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rerank-candidates", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = [q["query"] for q in sample_queries(args.data, args.queries)]
+    chunks = load_chunks(args.data, args.chunks)
+    print(f"corpus={args.data} queries={len(queries)} chunks={len(chunks)} top_k={args.top_k}\n")
+
+    # fp32 is the reference, so it always runs first
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    rows = [
+        run_backend(b, queries, chunks, args.batch_size, args.top_k, args.rerank_candidates)
+        for b in backends
+    ]
+    reference = rows[0]
+    reference_sims = reference["query_vectors"] @ reference["chunk_vectors"].T
+
+    print(
+        f"{'backend':<8}{'p50 ms':>9}{'p95 ms':>9}{'chunks/s':>10}{'pairs/s':>10}"
+        f"{'cosine':>9}{'dense@k':>9}{'rerank@k':>10}"
+    )
+    for row in rows:
+        cosine = float(np.mean(np.sum(row["chunk_vectors"] * reference["chunk_vectors"], axis=1)))
+        sims = row["query_vectors"] @ row["chunk_vectors"].T
+        dense_overlap = top_k_overlap(sims, reference_sims, args.top_k)
+        rerank_overlap = top_k_overlap(
+            row["rerank_scores"], reference["rerank_scores"], args.top_k
+        )
+        print(
+            f"{row['backend']:<8}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+            f"{row['chunks_per_sec']:>10.0f}{row['pairs_per_sec']:>10.0f}"
+            f"{cosine:>9.4f}{dense_overlap:>9.2%}{rerank_overlap:>10.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
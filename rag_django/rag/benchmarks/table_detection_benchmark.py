@@ -0,0 +1,96 @@
+"""
+Check the table pre-check (PDFParser.has_ruled_table) against running
+pdfplumber on every page.
+
+Reports, over the corpus: pages, pages handed to pdfplumber (candidates),
+pages that really hold an indexable table, tables the pre-check lost, and
+the table extraction time of both.
+
+Run from rag_django/:
+    python -m rag.benchmarks.table_detection_benchmark --data rag/data
+"""
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import pdfplumber
+
+from rag.data_ingestor.parsing import PDFParser, _page_tables
+
+
+def every_page(path: str) -> Dict:
+    """Baseline: one pdfplumber open, extract_tables on each page."""
+    start = time.perf_counter()
+    with pdfplumber.open(path) as pdf:
+        tables = [
+            table
+            for page_num, page in enumerate(pdf.pages)
+            for table in _page_tables(path, page_num, page)
+        ]
+    return {"seconds": time.perf_counter() - start, "pages": {table["page"] for table in tables}}
+
+
+def prefiltered(parser: PDFParser, path: str) -> Dict:
+    records, timings = parser.parse_timed(path)
+    return {
+        "seconds": timings["table_detect_seconds"] + timings["table_extract_seconds"],
+        "candidates": timings["table_candidate_pages"],
+        "pages": {record["page"] for record in records if record["type"] == "table"},
+        "page_count": timings["pages"],
+    }
+
+
+def run(folder: str) -> List[Dict]:
+    parser = PDFParser(extract_tables=True)
+    rows = []
+
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        path = os.path.join(folder, name)
+        baseline = every_page(path)
+        checked = prefiltered(parser, path)
+        rows.append({
+            "name": name,
+            "pages": checked["page_count"],
+            "candidates": checked["candidates"],
+            "table_pages": len(baseline["pages"]),
+            "missed": len(baseline["pages"] - checked["pages"]),
+            "baseline_seconds": baseline["seconds"],
+            "prefiltered_seconds": checked["seconds"],
+        })
+
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--data", default="rag/data")
+    args = arg_parser.parse_args()
+
+    rows = run(args.data)
+    header = f"{'file':<16}{'pages':>7}{'cand.':>7}{'tables':>8}{'missed':>8}{'all (s)':>10}{'pre (s)':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['name']:<16}{row['pages']:>7}{row['candidates']:>7}{row['table_pages']:>8}"
+            f"{row['missed']:>8}{row['baseline_seconds']:>10.2f}{row['prefiltered_seconds']:>10.2f}"
+        )
+
+    totals = {key: sum(row[key] for row in rows) for key in rows[0] if key != "name"}
+    print("-" * len(header))
+    print(
+        f"{'total':<16}{totals['pages']:>7}{totals['candidates']:>7}{totals['table_pages']:>8}"
+        f"{totals['missed']:>8}{totals['baseline_seconds']:>10.2f}{totals['prefiltered_seconds']:>10.2f}"
+    )
+    print(
+        f"candidate/actual {totals['candidates']}/{totals['table_pages']} "
+        f"({totals['candidates'] / max(1, totals['table_pages']):.2f}x), "
+        f"speedup {totals['baseline_seconds'] / max(1e-9, totals['prefiltered_seconds']):.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
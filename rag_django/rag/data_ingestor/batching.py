@@ -0,0 +1,151 @@
+import os
+import time
+from typing import Callable, Dict, List
+
+# Rough token estimate for MiniLM's WordPiece tokenizer; only used to group
+# chunks of similar length and to keep padded batches inside the budget.
+CHARS_PER_TOKEN = 4
+
+MIN_BATCH_SIZE = int(os.getenv("RAG_EMBED_MIN_BATCH", "8"))
+MAX_BATCH_SIZE = int(os.getenv("RAG_EMBED_MAX_BATCH", "256"))
+# padded tokens (batch size x longest chunk) one forward pass may hold
+MAX_BATCH_TOKENS = int(os.getenv("RAG_EMBED_MAX_BATCH_TOKENS", "32768"))
+# a new batch size has to beat the best one by this much to count as
+# faster, so timing noise does not keep the tuner moving
+MIN_GAIN = float(os.getenv("RAG_EMBED_MIN_GAIN", "0.05"))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 2
+
+
+class AdaptiveBatcher:
+    """
+    Length-bucketed embedding batches with a self-tuning batch size.
+
+    embed() sorts a window of chunks by length so short table rows and full
+    500-char chunks are not padded together, cuts the sorted list into
+    batches that fit both the current batch size and the padded-token
+    budget, and puts the vectors back in the original order.
+    Full batches steer the batch size by their tokens/sec (chunks/sec
+    would make the short batches of a sorted window look fast and the long
+    ones slow, whatever their size). It keeps doubling while throughput
+    improves, tries halving if the very first step was slower, and then
+    settles on the fastest size it measured.
+    """
+
+    def __init__(
+        self,
+        initial_batch_size: int = 64,
+        min_batch_size: int = MIN_BATCH_SIZE,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+        min_gain: float = MIN_GAIN,
+    ):
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.max_batch_tokens = max_batch_tokens
+        self.batch_size = min(max(initial_batch_size, self.min_batch_size), self.max_batch_size)
+        self.min_gain = min_gain
+        self.settled = False
+
+        self._direction = 2  # grow first
+        self._best_throughput = 0.0
+        self._first_size = self.batch_size
+        self._best_size = self.batch_size
+        self._reversed = False
+        self.chunks = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self.batches = 0
+
+    def plan(self, texts: List[str]) -> List[List[int]]:
+        """Index batches over `texts`, shortest chunks first."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = []
+        current = []
+        longest = 0
+
+        for i in order:
+            tokens = estimate_tokens(texts[i])
+            padded = max(longest, tokens) * (len(current) + 1)
+            if current and (len(current) >= self.batch_size or padded > self.max_batch_tokens):
+                batches.append(current)
+                current, longest = [], 0
+            current.append(i)
+            longest = max(longest, tokens)
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    def embed(self, texts: List[str], encode: Callable[[List[str]], List]) -> List:
+        """
+        Embed texts with `encode(batch_texts)` and return vectors in the
+        original order of `texts`.
+        """
+        vectors = [None] * len(texts)
+        planned_size = self.batch_size
+
+        for batch in self.plan(texts):
+            batch_texts = [texts[i] for i in batch]
+            tokens = sum(estimate_tokens(text) for text in batch_texts)
+
+            start = time.perf_counter()
+            embedded = encode(batch_texts)
+            self._record(len(batch), tokens, time.perf_counter() - start, planned_size)
+
+            for i, vector in zip(batch, embedded):
+                vectors[i] = vector
+
+        return vectors
+
+    def _record(self, count: int, tokens: int, seconds: float, planned_size: int):
+        self.chunks += count
+        self.tokens += tokens
+        self.seconds += seconds
+        self.batches += 1
+
+        # only full batches of the size being tried say anything about it
+        # (the rest of a window was planned before the size last changed)
+        if self.settled or seconds <= 0 or planned_size != self.batch_size or count < planned_size:
+            return
+
+        throughput = tokens / seconds
+        if throughput > self._best_throughput * (1 + self.min_gain):
+            self._best_throughput = throughput
+            self._best_size = self.batch_size
+            self._step()
+        elif not self._reversed and self._best_size == self._first_size:
+            # the very first step was slower: try the other way once
+            self._reversed = True
+            self._direction = 0.5 if self._direction > 1 else 2
+            self.batch_size = self._best_size
+            self._step()
+        else:
+            # slower than a size already measured: that one it is
+            self._settle()
+
+    def _step(self):
+        size = int(min(self.max_batch_size, max(self.min_batch_size, self.batch_size * self._direction)))
+        if size == self.batch_size:
+            # at a bound, nothing left to probe
+            self._settle()
+        else:
+            self.batch_size = size
+
+    def _settle(self):
+        self.batch_size = self._best_size
+        self.settled = True
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": self.chunks,
+            "batches": self.batches,
+            "seconds": self.seconds,
+            "chunks_per_sec": self.chunks / self.seconds if self.seconds else 0.0,
+            "tokens_per_sec": self.tokens / self.seconds if self.seconds else 0.0,
+            "batch_size": self.batch_size,
+            "settled": self.settled,
+        }
@@ -0,0 +1,170 @@
+import re
+from typing import Dict, List, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# MiniLM truncates anything longer, so token chunks are capped here
+MAX_MODEL_TOKENS = 256
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+class CharacterChunker:
+    """Recursive character splitting; chunk_size/chunk_overlap in characters."""
+
+    name = "character"
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            is_separator_regex=False,
+        )
+
+    def split(self, text: str) -> List[Tuple[str, Dict]]:
+        return [(chunk, {}) for chunk in self.splitter.split_text(text)]
+
+
+class TokenChunker:
+    """
+    Recursive splitting measured in embedding-model tokens, so no chunk is
+    silently truncated by the model. The tokenizer is loaded on first use
+    (and not pickled) so the chunker can still be shipped to parse workers.
+    """
+
+    name = "token"
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = min(chunk_size, MAX_MODEL_TOKENS)
+        self.chunk_overlap = min(chunk_overlap, self.chunk_size // 2)
+        self._splitter = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_splitter"] = None
+        return state
+
+    @property
+    def splitter(self):
+        if self._splitter is None:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+            self._splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+                tokenizer,
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+            )
+        return self._splitter
+
+    def split(self, text: str) -> List[Tuple[str, Dict]]:
+        return [(chunk, {}) for chunk in self.splitter.split_text(text)]
+
+
+class SentenceChunker:
+    """
+    Packs whole sentences/paragraphs up to chunk_size characters and
+    carries trailing sentences (up to chunk_overlap characters) into the
+    next chunk, so chunks never start or end mid-sentence.
+    """
+
+    name = "sentence"
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # for single sentences longer than a chunk
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=0,
+            length_function=len,
+            is_separator_regex=False,
+        )
+
+    def split(self, text: str) -> List[Tuple[str, Dict]]:
+        sentences = []
+        for sentence in _SENTENCE_END.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) > self.chunk_size:
+                sentences.extend(self._fallback.split_text(sentence))
+            else:
+                sentences.append(sentence)
+
+        chunks = []
+        current: List[str] = []
+        length = 0
+
+        for sentence in sentences:
+            if current and length + len(sentence) + 1 > self.chunk_size:
+                chunks.append(" ".join(current))
+
+                # keep the tail of the previous chunk as overlap
+                overlap: List[str] = []
+                overlap_length = 0
+                for previous in reversed(current):
+                    if overlap_length + len(previous) + 1 > self.chunk_overlap:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_length += len(previous) + 1
+                current, length = overlap, overlap_length
+
+            current.append(sentence)
+            length += len(sentence) + 1
+
+        if current:
+            chunks.append(" ".join(current))
+
+        return [(chunk, {}) for chunk in chunks]
+
+
+class ParentChildChunker:
+    """
+    Page-level parents with small, non-overlapping child chunks.
+
+    Only the children are embedded. They are flagged with "parent_child",
+    which the ingestor turns into a per-page parent_id; the retriever then
+    joins a hit's siblings back into the full page as LLM context.
+    """
+
+    name = "parent_child"
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = 0
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=max(100, chunk_size // 2),
+            chunk_overlap=0,
+            length_function=len,
+            is_separator_regex=False,
+        )
+
+    def split(self, text: str) -> List[Tuple[str, Dict]]:
+        return [
+            (chunk, {"parent_child": True})
+            for chunk in self.splitter.split_text(text)
+        ]
+
+
+CHUNKING_STRATEGIES = {
+    chunker.name: chunker
+    for chunker in (CharacterChunker, TokenChunker, SentenceChunker, ParentChildChunker)
+}
+
+
+def get_chunker(strategy: str, chunk_size: int, chunk_overlap: int):
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(
+            f"Unknown chunking strategy {strategy!r}, expected one of {sorted(CHUNKING_STRATEGIES)}"
+        )
+    return CHUNKING_STRATEGIES[strategy](chunk_size, chunk_overlap)
+
+
+def chunking_signature(chunker) -> str:
+    """Identifies how a document was chunked, e.g. 'character:500:200'."""
+    return f"{chunker.name}:{chunker.chunk_size}:{chunker.chunk_overlap}"
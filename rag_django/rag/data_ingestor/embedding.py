@@ -1,12 +1,6 @@
-from sentence_transformers import SentenceTransformer
+from rag.inference.registry import EMBEDDING_MODEL_NAME, get_embedding_model, model_key
 
-_embedding_model = None
-
-def get_embedding_model():
-    global _embedding_model
-    if _embedding_model is None:
-        _embedding_model = SentenceTransformer(
-            "all-MiniLM-L6-v2",
-            device="cpu"
-        )
-    return _embedding_model
+# Kept for existing imports; the model itself now comes from the shared
+# registry so the ingestor and the retriever use the same instance and
+# backend (RAG_INFERENCE_BACKEND).
+__all__ = ["EMBEDDING_MODEL_NAME", "get_embedding_model", "model_key"]
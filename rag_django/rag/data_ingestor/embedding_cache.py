@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+# Shared by every user collection under vector_store/, so the same textbook
+# uploaded by two users is embedded once. Empty string disables the cache.
+EMBEDDING_CACHE_PATH = os.getenv(
+    "RAG_EMBEDDING_CACHE_PATH",
+    os.path.join("vector_store", "_embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+
+class ChunkEmbeddingCache:
+    """
+    On-disk, content-addressed cache: sha256(model name + chunk text) -> vector.
+
+    Vectors are stored as float32 blobs in SQLite (WAL mode, so several
+    ingestion workers can share the file). When the cache grows past
+    max_entries the least recently used tenth is evicted.
+    """
+
+    def __init__(
+        self,
+        db_path: str = EMBEDDING_CACHE_PATH,
+        model_name: str = "",
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ):
+        self.db_path = db_path
+        self.model_name = model_name
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS chunk_embeddings_last_used "
+            "ON chunk_embeddings (last_used)"
+        )
+        self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        keys = [self._key(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            unique = list(set(keys))
+            # stay under SQLite's host-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, embedding FROM chunk_embeddings "
+                    f"WHERE key IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE chunk_embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._db.commit()
+
+            vectors = [found.get(key) for key in keys]
+            hits = sum(1 for v in vectors if v is not None)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+
+        return vectors
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = [
+            (self._key(text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (key, embedding, last_used) "
+                "VALUES (?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        excess = count - self.max_entries + self.max_entries // 10
+        self._db.execute(
+            "DELETE FROM chunk_embeddings WHERE key IN ("
+            "SELECT key FROM chunk_embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            size = self._db.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": size,
+                "max_entries": self.max_entries,
+            }
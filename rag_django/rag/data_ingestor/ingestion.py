@@ -1,19 +1,47 @@
+import copy
 import os
-import fitz
-import uuid
-from typing import List, Dict
+import time
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterator, Optional, Tuple
 from chromadb import PersistentClient
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 import torch
 torch.set_default_device("cpu")
-from rag.data_ingestor.embedding import get_embedding_model
-
-# Optional: only import if table extraction is enabled
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+from rag.data_ingestor.batching import AdaptiveBatcher
+from rag.data_ingestor.chunking import chunking_signature, get_chunker
+from rag.data_ingestor.embedding import EMBEDDING_MODEL_NAME, get_embedding_model, model_key
+from rag.data_ingestor.embedding_cache import EMBEDDING_CACHE_PATH, ChunkEmbeddingCache
+from rag.data_ingestor.locking import collection_lock
+from rag.data_ingestor.manifest import IngestManifest, bump_collection_version, file_sha256
+from rag.data_ingestor.parsing import PDFParser
+from rag.data_ingestor.partitions import CollectionPartitions
+from rag.data_ingestor.spool import ChunkSpool
+from rag.data_ingestor.table_store import TableStore, table_store_path
+from rag.retriever.score_cache import get_score_cache
+
+# Chunking defaults, overridable per ingestor (web.tasks passes the
+# RAG_CHUNKING settings). Strategies live in rag.data_ingestor.chunking.
+CHUNKING_STRATEGY = os.getenv("RAG_CHUNKING_STRATEGY", "character")
+CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "200"))
+
+# Parallel parsing: number of worker processes (1 = parse in-process) and
+# how many pages one task covers, so a single large PDF is split up too.
+PARSE_WORKERS = int(os.getenv("RAG_PARSE_WORKERS", "1"))
+PAGES_PER_TASK = int(os.getenv("RAG_PAGES_PER_TASK", "40"))
+# processes for pdfplumber on table-candidate pages when parsing in-process
+TABLE_WORKERS = int(os.getenv("RAG_TABLE_WORKERS", "1"))
+
+# chunks parsed into one window; the embedder regroups each window by
+# length (see AdaptiveBatcher) and the writer adds it to Chroma in one call
+WINDOW_SIZE = int(os.getenv("RAG_INGEST_WINDOW", "512"))
+# windows allowed to wait between two pipeline stages; bounds peak memory
+QUEUE_DEPTH = 4
+
+_DONE = object()
 
 
 class FolderPDFIngestor:
@@ -22,208 +50,665 @@ class FolderPDFIngestor:
         folder_path: str, 
         chroma_dir: str, 
         collection_name: str,
-        extract_tables: bool = False 
+        extract_tables: bool = False,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        chunking_strategy: str = CHUNKING_STRATEGY,
+        parse_workers: int = PARSE_WORKERS,
+        pages_per_task: int = PAGES_PER_TASK,
+        table_workers: int = TABLE_WORKERS,
+        embedding_cache_path: str = EMBEDDING_CACHE_PATH,
+        files: Optional[List[str]] = None,
+        checkpoint: Optional[Dict] = None
     ):
         self.folder_path = folder_path
+        # file names to ingest from folder_path; None means every PDF in it
+        self.files = files
         self.embedding_model = get_embedding_model()
-        self.extract_tables = extract_tables and PDFPLUMBER_AVAILABLE
-
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=350,
-            length_function=len,
-            is_separator_regex=False,
+        self.batcher = AdaptiveBatcher()
+        # chunk text -> vector, shared across collections; None disables it.
+        # Keyed by model and backend, int8/ONNX vectors are not bit-identical.
+        self.embedding_cache = (
+            ChunkEmbeddingCache(embedding_cache_path, model_name=model_key(EMBEDDING_MODEL_NAME))
+            if embedding_cache_path else None
         )
 
-        self.client = PersistentClient(path=chroma_dir)
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+        chunker = get_chunker(chunking_strategy, chunk_size, chunk_overlap)
+        self.chunking = chunking_signature(chunker)
+
+        self.parse_workers = max(1, parse_workers)
+        self.parser = PDFParser(
+            chunker=chunker,
+            extract_tables=extract_tables,
+            # page ranges already run in parallel; no nested pools
+            table_workers=table_workers if self.parse_workers == 1 else 1
         )
+        self.extract_tables = self.parser.extract_tables
+        self.pages_per_task = max(1, pages_per_task)
+
+        self.chroma_dir = chroma_dir
+        self.collection_name = collection_name
+        # Chroma is opened on first write, so fan-out tasks that only
+        # spool chunks (see spool_unit) never touch it
+        self.client = None
+        self._partitions = None
+        # table markdown is kept out of Chroma metadata (see table_store.py)
+        self.table_store = TableStore(table_store_path(chroma_dir, collection_name))
+
+        # what is already in the collection, so unchanged PDFs are skipped
+        self.manifest = IngestManifest(chroma_dir, collection_name)
+        self.skipped = []
+        self._replaced_doc_ids = []
+        self._rechunked_doc_ids = []
+        self._manifest_updates = {}
+        self._pdfs = None
+
+        # Units (page ranges) whose chunks are committed, so a crashed or
+        # retried run skips them. Chunk ids are deterministic and written
+        # with upsert, so redoing a unit that was written but not yet
+        # checkpointed is harmless. on_checkpoint(state) is called with a
+        # copy after every change, from the writer thread.
+        self.checkpoint = copy.deepcopy(checkpoint) if checkpoint else {}
+        self.checkpoint.setdefault("prepared", False)
+        self.checkpoint.setdefault("units", {})
+        self.on_checkpoint = None
+        self._checkpoint_lock = threading.Lock()
+
+        # running counters instead of keeping every chunk in memory
+        self.stats = {"pages_parsed": 0, "documents": 0, "chunks_written": 0, "tables": 0}
+        self._written_doc_ids = set()
+        # optional on_stage(name, count) hook, called with deltas for
+        # "pages_parsed", "chunks_embedded" and "chunks_written" from
+        # whichever pipeline thread did the work (see web.progress)
+        self.on_stage = None
+        # seconds spent per stage, summed over all page ranges
+        self.timings = {
+            "text_seconds": 0.0,
+            "table_detect_seconds": 0.0,
+            "table_extract_seconds": 0.0,
+            "embed_seconds": 0.0,
+            "write_seconds": 0.0,
+            "pages": 0,
+            "table_candidate_pages": 0,
+            "table_pages": 0,
+        }
 
-        self.documents = []
-        self.metadatas = []
-        self.ids = []
+    @property
+    def partitions(self) -> CollectionPartitions:
+        # text and tables go to separate collections (see partitions.py)
+        if self._partitions is None:
+            self.client = PersistentClient(path=self.chroma_dir)
+            # the legacy migration writes, so it runs under the collection
+            # lock (_run_pipeline, commit_spooled), not on open
+            self._partitions = CollectionPartitions(
+                self.client, self.collection_name, migrate=False
+            )
+        return self._partitions
 
     def _list_pdfs(self):
+        names = os.listdir(self.folder_path) if self.files is None else self.files
         return [
             os.path.join(self.folder_path, f)
-            for f in os.listdir(self.folder_path)
+            for f in sorted(names)
             if f.lower().endswith(".pdf")
         ]
 
-    def _load_pdf(self, path):
-        doc = fitz.open(path)
-        pages = []
-
-        for i, page in enumerate(doc):
-            text = page.get_text().strip()
-            if text:
-                pages.append({"text": text, "page": i + 1})
+    def _select_pdfs(self) -> List[Tuple[str, str, str]]:
+        """
+        (path, name, doc_id) for every PDF that is new or changed since the
+        last run; unchanged files are only recorded in self.skipped.
+        """
+        selected = []
 
-        return pages
-
-    def _extract_tables(self, pdf_path: str) -> List[Dict]:
-        """Extract tables from PDF using pdfplumber"""
-        if not self.extract_tables:
-            return []
-        
-        tables_data = []
-        
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    tables = page.extract_tables()
-                    
-                    for table_idx, table in enumerate(tables):
-                        if table and len(table) > 0:
-                            # Convert to markdown
-                            markdown = self._table_to_markdown(table)
-                            # Create searchable text
-                            searchable = self._table_to_searchable_text(table)
-                            
-                            if searchable:  # Only add if has content
-                                tables_data.append({
-                                    'page': page_num + 1,
-                                    'markdown': markdown,
-                                    'searchable': searchable,
-                                    'table_idx': table_idx
-                                })
-        except Exception as e:
-            print(f"Warning: Table extraction failed for {pdf_path}: {e}")
-        
-        return tables_data
-
-    def _table_to_markdown(self, table: List[List]) -> str:
-        """Convert table to markdown format"""
-        if not table or len(table) < 1:
-            return ""
-        
-        headers = table[0]
-        markdown = "| " + " | ".join(str(h) if h else "" for h in headers) + " |\n"
-        markdown += "| " + " | ".join(["---"] * len(headers)) + " |\n"
-        
-        for row in table[1:]:
-            markdown += "| " + " | ".join(str(cell) if cell else "" for cell in row) + " |\n"
-        
-        return markdown
-
-    def _table_to_searchable_text(self, table: List[List]) -> str:
-        """Create searchable text from table"""
-        if not table or len(table) < 2:
-            return ""
-        
-        text_parts = []
-        headers = table[0]
-        
-        for row in table[1:]:
-            for idx, cell in enumerate(row):
-                if cell and idx < len(headers) and headers[idx]:
-                    text_parts.append(f"{headers[idx]}: {cell}")
-        
-        return " | ".join(text_parts)
-
-    def _prepare_chunks(self):
         for pdf_path in self._list_pdfs():
             pdf_name = os.path.basename(pdf_path)
-            doc_id = str(uuid.uuid4())
-
-            # Process regular text chunks
-            for page in self._load_pdf(pdf_path):
-                chunks = self.splitter.split_text(page["text"])
-
-                for idx, chunk in enumerate(chunks):
-                    self.documents.append(chunk)
-                    self.metadatas.append({
-                        "doc_id": doc_id,
-                        "source": pdf_name,
-                        "page": page["page"],
-                        "chunk_index": idx,
-                        "type": "text"
-                    })
-                    self.ids.append(f"{doc_id}_{page['page']}_text_{idx}")
-
-            # Process tables if enabled
-            if self.extract_tables:
-                tables = self._extract_tables(pdf_path)
-                for table in tables:
-                    self.documents.append(table['searchable'])
-                    self.metadatas.append({
-                        "doc_id": doc_id,
-                        "source": pdf_name,
-                        "page": table['page'],
-                        "chunk_index": table['table_idx'],
-                        "type": "table",
-                        "table_markdown": table['markdown']
-                    })
-                    self.ids.append(f"{doc_id}_table_{table['page']}_{table['table_idx']}")
-
-    def _batched(self, batch_size):
-        for i in range(0, len(self.documents), batch_size):
-            yield i
+            # content hash -> the same file gets the same doc_id on every run
+            doc_id = file_sha256(pdf_path)[:32]
+
+            indexed = self.manifest.get(pdf_name)
+            if indexed and indexed["doc_id"] == doc_id and indexed.get("chunking") == self.chunking:
+                self.skipped.append(pdf_name)
+                continue
+            if indexed and indexed["doc_id"] != doc_id:
+                # file changed since the last run, its old chunks get replaced
+                self._replaced_doc_ids.append(indexed["doc_id"])
+
+            existing = self.manifest.find_doc(doc_id, self.chunking)
+            if existing is not None:
+                # identical content already indexed under another file name
+                self._manifest_updates[pdf_name] = dict(existing)
+                self.skipped.append(pdf_name)
+                continue
+
+            if self.manifest.has_doc(doc_id) and doc_id not in self._rechunked_doc_ids:
+                # same content, indexed with another chunking config: its
+                # chunk ids may collide with the new ones, so drop it first
+                self._rechunked_doc_ids.append(doc_id)
+
+            selected.append((pdf_path, pdf_name, doc_id))
+
+        return selected
+
+    def _page_ranges(self, pdfs: List[Tuple[str, str, str]]) -> List[Tuple]:
+        """
+        One unit of parsing work per page range, so large PDFs are spread
+        over several workers and never held in memory as a whole.
+        """
+        units = []
+        for pdf_path, pdf_name, doc_id in pdfs:
+            page_count = PDFParser.page_count(pdf_path)
+            starts = list(range(0, max(page_count, 1), self.pages_per_task))
+            for first_page in starts:
+                last_page = min(first_page + self.pages_per_task, page_count)
+                units.append((
+                    pdf_path, pdf_name, doc_id, first_page, last_page,
+                    first_page == starts[-1]
+                ))
+        return units
+
+    def _iter_parsed(self, units: List[Tuple]) -> Iterator[Tuple[Tuple, Tuple[List[Dict], Dict]]]:
+        """
+        Yield (unit, (records, timings)) in unit order, serially or from a process pool
+        with a bounded number of ranges in flight.
+        """
+        if self.parse_workers == 1:
+            for unit in units:
+                yield unit, self.parser.parse_timed(unit[0], unit[3], unit[4])
+            return
 
-    def ingest(self):
-        self._prepare_chunks()
+        # spawn: the parent has torch loaded, the workers only need fitz/pdfplumber
+        with ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            pending = deque()
+            remaining = iter(units)
+
+            for unit in remaining:
+                pending.append((unit, executor.submit(self.parser.parse_timed, unit[0], unit[3], unit[4])))
+                if len(pending) >= self.parse_workers * 2:
+                    break
+
+            while pending:
+                unit, future = pending.popleft()
+                records = future.result()
+                next_unit = next(remaining, None)
+                if next_unit is not None:
+                    pending.append((
+                        next_unit,
+                        executor.submit(self.parser.parse_timed, next_unit[0], next_unit[3], next_unit[4])
+                    ))
+                yield unit, records
+
+    @staticmethod
+    def _chunk_row(record: Dict, pdf_name: str, doc_id: str) -> Tuple[str, Dict, str]:
+        """(document, metadata, id) for one parsed record."""
+        metadata = {
+            "doc_id": doc_id,
+            "source": pdf_name,
+            "page": record["page"],
+            "chunk_index": record["chunk_index"],
+            "type": record["type"],
+        }
 
-        if not self.documents:
-            return {"status": "no_documents"}
+        if record["type"] == "table":
+            # moved to the table store by the writer
+            metadata["table_markdown"] = record["table_markdown"]
+            return record["content"], metadata, f"{doc_id}_table_{record['page']}_{record['chunk_index']}"
 
-        BATCH_SIZE = 64
+        if record.get("parent_child"):
+            # children of one page share a parent the retriever can rebuild
+            metadata["parent_id"] = f"{doc_id}_{record['page']}"
+        return record["content"], metadata, f"{doc_id}_{record['page']}_text_{record['chunk_index']}"
 
-        for i in self._batched(BATCH_SIZE):
-            batch_docs = self.documents[i:i + BATCH_SIZE]
-            batch_metas = self.metadatas[i:i + BATCH_SIZE]
-            batch_ids = self.ids[i:i + BATCH_SIZE]
+    @staticmethod
+    def _unit_key(unit) -> str:
+        pdf_name, first_page, last_page = unit[1], unit[3], unit[4]
+        return f"{pdf_name}:{first_page}:{last_page}"
 
-            embeddings = self.embedding_model.encode(
-                batch_docs,
-                normalize_embeddings=True,
-                show_progress_bar=True
-            )
+    def _pending_units(self, pdfs: List[Tuple[str, str, str]]) -> List[Tuple]:
+        return [
+            unit for unit in self._page_ranges(pdfs)
+            if self._unit_key(unit) not in self.checkpoint["units"]
+        ]
 
-            self.collection.add(
-                documents=batch_docs,
-                embeddings=embeddings.tolist(),
-                metadatas=batch_metas,
-                ids=batch_ids
+    def _iter_batches(self, pdfs: List[Tuple[str, str, str]], batch_size: int):
+        """
+        Parse stage: yields (documents, metadatas, ids, pages_done, finished)
+        batches. finished holds (unit key, counts) for the units whose
+        chunks are all in this batch or an earlier one; they are
+        checkpointed once the batch is written.
+        Only one page range plus one batch is held at a time.
+        """
+        documents, metadatas, ids, finished = [], [], [], []
+
+        for unit, (records, timings) in self._iter_parsed(self._pending_units(pdfs)):
+            pdf_path, pdf_name, doc_id, first_page, last_page, _ = unit
+            for key, value in timings.items():
+                self.timings[key] += value
+            counts = {
+                "pdf_name": pdf_name,
+                "doc_id": doc_id,
+                "chunks": 0,
+                "tables": 0,
+                "pages": last_page - first_page,
+            }
+
+            for record in records:
+                document, metadata, chunk_id = self._chunk_row(record, pdf_name, doc_id)
+                documents.append(document)
+                metadatas.append(metadata)
+                ids.append(chunk_id)
+                counts["tables" if record["type"] == "table" else "chunks"] += 1
+
+                if len(documents) == batch_size:
+                    yield documents, metadatas, ids, self.stats["pages_parsed"], finished
+                    documents, metadatas, ids, finished = [], [], [], []
+
+            self.stats["pages_parsed"] += last_page - first_page
+            self._report("pages_parsed", last_page - first_page)
+            finished.append((self._unit_key(unit), counts))
+
+        if documents or finished:
+            yield documents, metadatas, ids, self.stats["pages_parsed"], finished
+
+    def _save_checkpoint(self):
+        if self.on_checkpoint is not None:
+            with self._checkpoint_lock:
+                state = copy.deepcopy(self.checkpoint)
+            self.on_checkpoint(state)
+
+    def _checkpoint_units(self, finished: List[Tuple[str, Dict]]):
+        if not finished:
+            return
+        with self._checkpoint_lock:
+            for key, counts in finished:
+                self.checkpoint["units"][key] = counts
+        self._save_checkpoint()
+
+    def _resume_from_checkpoint(self):
+        """Count what earlier attempts of this job already committed."""
+        for counts in self.checkpoint["units"].values():
+            self.stats["pages_parsed"] += counts["pages"]
+            self.stats["chunks_written"] += counts["chunks"] + counts["tables"]
+            self.stats["tables"] += counts["tables"]
+            self._written_doc_ids.add(counts["doc_id"])
+        self.stats["documents"] = len(self._written_doc_ids)
+
+    def _prepare(self):
+        """
+        Drop the old chunks of re-chunked documents. Done once per job: on
+        resume they would take the already committed new chunks with them.
+        """
+        if self.checkpoint["prepared"]:
+            return
+        for doc_id in self._rechunked_doc_ids:
+            self._delete_document(doc_id)
+        self.checkpoint["prepared"] = True
+        self._save_checkpoint()
+
+    def _remove_replaced_documents(self):
+        current = {entry["doc_id"] for entry in self._manifest_updates.values()}
+        for doc_id in self._replaced_doc_ids:
+            still_used = doc_id in current or any(
+                entry["doc_id"] == doc_id
+                for name, entry in self.manifest.files.items()
+                if name not in self._manifest_updates
             )
+            if not still_used:
+                self._delete_document(doc_id)
+
+    def _delete_document(self, doc_id: str):
+        self.partitions.delete(where={"doc_id": doc_id})
+        self.table_store.delete_doc(doc_id)
+
+    def _store_tables(self, metadatas: List[Dict], ids: List[str]):
+        """
+        Move table markdown from the metadata into the table store, leaving
+        a table_ref. Runs before the Chroma write, so every visible table
+        chunk already has its markdown.
+        """
+        tables = [(chunk_id, meta) for chunk_id, meta in zip(ids, metadatas) if "table_markdown" in meta]
+        if not tables:
+            return
+
+        self.table_store.put_many(
+            [chunk_id for chunk_id, _ in tables],
+            [meta["doc_id"] for _, meta in tables],
+            [meta.pop("table_markdown") for _, meta in tables]
+        )
+        for chunk_id, meta in tables:
+            meta["table_ref"] = chunk_id
+
+    def _write(
+        self,
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        ids: List[str]
+    ):
+        if not documents:
+            return
 
+        start = time.perf_counter()
+        self._store_tables(metadatas, ids)
+        # upsert: redoing a unit after a crash overwrites instead of skipping
+        self.partitions.upsert(
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+        self.timings["write_seconds"] += time.perf_counter() - start
+        self.stats["chunks_written"] += len(documents)
+        self.stats["tables"] += sum(1 for m in metadatas if m["type"] == "table")
+        self._written_doc_ids.update(m["doc_id"] for m in metadatas)
+        self.stats["documents"] = len(self._written_doc_ids)
+        self._report("chunks_written", len(documents))
+
+    def _report(self, stage: str, count: int):
+        if self.on_stage is not None and count:
+            self.on_stage(stage, count)
+
+    def _commit_manifest(self):
+        """
+        Record the new/changed files only after their chunks are written.
+        Runs under the collection lock; reloading first keeps entries
+        another job committed since this one started.
+        """
+        self.manifest.load()
+        for counts in self.checkpoint["units"].values():
+            entry = self._manifest_updates.setdefault(counts["pdf_name"], {
+                "doc_id": counts["doc_id"],
+                "chunking": self.chunking,
+                "chunks": 0,
+                "tables": 0,
+            })
+            entry["chunks"] += counts["chunks"]
+            entry["tables"] += counts["tables"]
+        self._remove_replaced_documents()
+        for pdf_name, entry in self._manifest_updates.items():
+            self.manifest.record(pdf_name, **entry)
+            # other names for the same content now point at the new chunks too
+            for other in self.manifest.files.values():
+                if other["doc_id"] == entry["doc_id"]:
+                    other.update(entry)
+        self.manifest.save()
+
+    def _invalidate_caches(self):
+        """
+        Cached rerank scores for this collection are stale once chunks are
+        written. The version bump tells other processes (the web server,
+        when this runs in a Celery worker) to drop theirs.
+        """
+        get_score_cache().invalidate(self.collection_name)
+        bump_collection_version(self.chroma_dir, self.collection_name)
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Vectors for a window of chunks. Cached chunks cost a lookup; the
+        rest are de-duplicated, encoded once and added to the cache.
+        """
+        if self.embedding_cache is None:
+            return self.batcher.embed(texts, self._encode)
+
+        vectors = self.embedding_cache.get_many(texts)
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
+
+        if missing:
+            unique_texts = list(missing)
+            encoded = self.batcher.embed(unique_texts, self._encode)
+            self.embedding_cache.put_many(unique_texts, encoded)
+
+            for text, vector in zip(unique_texts, encoded):
+                for i in missing[text]:
+                    vectors[i] = vector
+
+        return vectors
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        # batch_size=len(texts): the batcher already chose the batch
+        return self.embedding_model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).tolist()
+
+    def _run_pipeline(self) -> Iterator[int]:
+        """
+        Parse -> embed -> write with bounded queues between the stages:
+        a parser thread fills `parsed`, this thread embeds, and a writer
+        thread drains `to_write` into Chroma, so the three overlap and at
+        most QUEUE_DEPTH batches wait between any two of them.
+        Yields progress (0-100, by pages) after every written batch.
+        """
+        pdfs = self._pdfs if self._pdfs is not None else self._select_pdfs()
+        # one writer per collection at a time, across processes
+        with collection_lock(self.chroma_dir, self.collection_name):
+            self.partitions.migrate_legacy(self.table_store)
+            yield from self._pipeline(pdfs)
+
+    def _pipeline(self, pdfs: List[Tuple[str, str, str]]) -> Iterator[int]:
+        self._resume_from_checkpoint()
+        self._prepare()
+        total_pages = sum(PDFParser.page_count(pdf_path) for pdf_path, _, _ in pdfs)
+
+        parsed = queue.Queue(maxsize=QUEUE_DEPTH)
+        to_write = queue.Queue(maxsize=QUEUE_DEPTH)
+        written = queue.Queue()
+        stop = threading.Event()
+        errors = []
+
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def parse_stage():
+            try:
+                for batch in self._iter_batches(pdfs, WINDOW_SIZE):
+                    put(parsed, batch)
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(parsed, _DONE)
+
+        def write_stage():
+            try:
+                while True:
+                    try:
+                        item = to_write.get(timeout=0.1)
+                    except queue.Empty:
+                        if stop.is_set():
+                            return
+                        continue
+                    if item is _DONE:
+                        return
+                    documents, embeddings, metadatas, ids, pages_done, finished = item
+                    self._write(documents, embeddings, metadatas, ids)
+                    self._checkpoint_units(finished)
+                    written.put(pages_done)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+        def drain():
+            while True:
+                try:
+                    pages_done = written.get_nowait()
+                except queue.Empty:
+                    return
+                yield int(pages_done / total_pages * 100) if total_pages else 100
+
+        parser = threading.Thread(target=parse_stage, daemon=True)
+        writer = threading.Thread(target=write_stage, daemon=True)
+        parser.start()
+        writer.start()
+
+        try:
+            while not errors:
+                try:
+                    item = parsed.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                documents, metadatas, ids, pages_done, finished = item
+
+                start = time.perf_counter()
+                embeddings = self._embed(documents) if documents else []
+                self.timings["embed_seconds"] += time.perf_counter() - start
+                self._report("chunks_embedded", len(documents))
+
+                put(to_write, (documents, embeddings, metadatas, ids, pages_done, finished))
+                yield from drain()
+
+            put(to_write, _DONE)
+            writer.join()
+            if errors:
+                raise errors[0]
+            yield from drain()
+        finally:
+            stop.set()
+            parser.join()
+            writer.join()
+
+        self._commit_manifest()
+        if self.stats["chunks_written"]:
+            self._invalidate_caches()
+
+    def plan(self) -> Dict:
+        """
+        Select the PDFs to index and split them into page-range units, so
+        they can run as separate tasks (spool_unit) and be committed by one
+        (commit_spooled). Everything returned is JSON-serialisable.
+        """
+        self._pdfs = self._select_pdfs()
         return {
-            "status": "success",
-            "documents": len(set(m["doc_id"] for m in self.metadatas)),
-            "chunks": len(self.documents),
-            "tables": len([m for m in self.metadatas if m.get("type") == "table"])
+            # units checkpointed by an earlier attempt are left out
+            "units": [list(unit) for unit in self._pending_units(self._pdfs)],
+            "replaced_doc_ids": list(self._replaced_doc_ids),
+            "rechunked_doc_ids": list(self._rechunked_doc_ids),
+            "aliases": dict(self._manifest_updates),
+            "skipped": list(self.skipped),
         }
 
-    def ingest_with_progress(self):
-        """Generator for UI progress"""
-        self._prepare_chunks()
-
-        total = len(self.documents)
-        if total == 0:
-            yield 100
-            return
+    def spool_unit(self, unit: List, spool_path: str) -> Dict:
+        """
+        Parse and embed one planned unit into a spool file instead of
+        Chroma. Returns the counts commit_spooled() needs.
+        """
+        pdf_path, pdf_name, doc_id, first_page, last_page, _ = unit
+        records, timings = self.parser.parse_timed(pdf_path, first_page, last_page)
+        rows = [self._chunk_row(record, pdf_name, doc_id) for record in records]
+        self._report("pages_parsed", last_page - first_page)
+
+        # a retried or redelivered task starts its spool over
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+        spool = ChunkSpool(spool_path)
+        try:
+            for i in range(0, len(rows), WINDOW_SIZE):
+                documents, metadatas, ids = map(list, zip(*rows[i:i + WINDOW_SIZE]))
+                start = time.perf_counter()
+                embeddings = self._embed(documents)
+                timings["embed_seconds"] = timings.get("embed_seconds", 0.0) + time.perf_counter() - start
+                spool.add(documents, embeddings, metadatas, ids)
+                self._report("chunks_embedded", len(documents))
+        finally:
+            spool.close()
+
+        tables = sum(1 for record in records if record["type"] == "table")
+        return {
+            "key": self._unit_key(unit),
+            "pdf_name": pdf_name,
+            "doc_id": doc_id,
+            "chunks": len(records) - tables,
+            "tables": tables,
+            "pages": last_page - first_page,
+            "timings": timings,
+        }
 
-        BATCH_SIZE = 64
-        processed = 0
+    def commit_spooled(self, plan: Dict, results: List[Dict], spool_paths: List[str]):
+        """
+        Single writer of a fanned-out ingestion: copy the spooled chunks
+        into Chroma in unit order, checkpointing each unit, then record
+        the manifest.
+        """
+        self._replaced_doc_ids = list(plan["replaced_doc_ids"])
+        self._rechunked_doc_ids = list(plan["rechunked_doc_ids"])
+        self._manifest_updates = {name: dict(entry) for name, entry in plan["aliases"].items()}
+        self.skipped = list(plan["skipped"])
+
+        self._resume_from_checkpoint()
+
+        with collection_lock(self.chroma_dir, self.collection_name):
+            self.partitions.migrate_legacy(self.table_store)
+            self._prepare()
+
+            for result, path in zip(results, spool_paths):
+                if result["key"] in self.checkpoint["units"]:
+                    continue
+                spool = ChunkSpool(path)
+                try:
+                    for documents, embeddings, metadatas, ids in spool.iter_batches(WINDOW_SIZE):
+                        self._write(documents, embeddings, metadatas, ids)
+                finally:
+                    spool.close()
+
+                self.stats["pages_parsed"] += result["pages"]
+                for key, value in result["timings"].items():
+                    self.timings[key] = self.timings.get(key, 0) + value
+                self._checkpoint_units([(result["key"], {
+                    name: result[name] for name in ("pdf_name", "doc_id", "chunks", "tables", "pages")
+                })])
+
+            self._commit_manifest()
+
+        if self.stats["chunks_written"]:
+            self._invalidate_caches()
 
-        for i in self._batched(BATCH_SIZE):
-            batch_docs = self.documents[i:i + BATCH_SIZE]
-            batch_metas = self.metadatas[i:i + BATCH_SIZE]
-            batch_ids = self.ids[i:i + BATCH_SIZE]
+    def ingest(self):
+        for _ in self._run_pipeline():
+            pass
+
+        if not self.stats["chunks_written"]:
+            return {
+                "status": "no_documents",
+                "skipped": len(self.skipped),
+                "timings": self.timings,
+                "embedding": self.batcher.stats(),
+                "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None
+            }
 
-            embeddings = self.embedding_model.encode(
-                batch_docs,
-                normalize_embeddings=True,
-                show_progress_bar=False
-            )
+        return {
+            "status": "success",
+            "documents": self.stats["documents"],
+            "chunks": self.stats["chunks_written"],
+            "tables": self.stats["tables"],
+            "skipped": len(self.skipped),
+            "timings": self.timings,
+            "embedding": self.batcher.stats(),
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None
+        }
 
-            self.collection.add(
-                documents=batch_docs,
-                embeddings=embeddings.tolist(),
-                metadatas=batch_metas,
-                ids=batch_ids
-            )
+    def ingest_with_progress(self):
+        """Generator for UI progress"""
+        last = None
+        for progress in self._run_pipeline():
+            if progress != last:
+                last = progress
+                yield progress
 
-            processed += len(batch_docs)
-            yield int((processed / total) * 100)
\ No newline at end of file
+        if last != 100:
+            yield 100
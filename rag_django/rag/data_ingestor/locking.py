@@ -0,0 +1,43 @@
+import os
+import time
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def collection_lock(chroma_dir: str, collection_name: str):
+    """
+    Exclusive, cross-process lock on one collection.
+
+    Chroma's PersistentClient is not safe with several processes writing
+    the same store, so every writer (an ingestion run, or the commit step
+    of a fanned-out one) holds this while it writes. Readers don't take it.
+    """
+    os.makedirs(chroma_dir, exist_ok=True)
+    path = os.path.join(chroma_dir, f"{collection_name}.lock")
+
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10s; keep waiting
+                    time.sleep(1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
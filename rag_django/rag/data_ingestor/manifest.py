@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _version_path(chroma_dir: str, collection_name: str) -> str:
+    return os.path.join(chroma_dir, f"{collection_name}.version")
+
+
+def collection_version(chroma_dir: str, collection_name: str) -> int:
+    """
+    Changes whenever an ingestion writes to the collection, in whatever
+    process it ran. Readers compare it (one stat call) to notice that
+    their cached state is stale. 0 if never written.
+    """
+    try:
+        return os.stat(_version_path(chroma_dir, collection_name)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def bump_collection_version(chroma_dir: str, collection_name: str):
+    path = _version_path(chroma_dir, collection_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+
+
+class IngestManifest:
+    """
+    Per-collection record of which PDFs are already indexed.
+
+    Stored as JSON next to the Chroma files:
+        {"files": {"<pdf name>": {"doc_id": ..., "chunking": ..., "chunks": ..., "tables": ...}}}
+    doc_id is derived from the file's content hash, so an unchanged file
+    maps to the same doc_id on every run; "chunking" records the chunking
+    config it was indexed with (see chunking.chunking_signature).
+    """
+
+    def __init__(self, chroma_dir: str, collection_name: str):
+        self.path = os.path.join(chroma_dir, f"{collection_name}_manifest.json")
+        self.files: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        else:
+            self.files = {}
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, pdf_name: str) -> Optional[Dict]:
+        return self.files.get(pdf_name)
+
+    def find_doc(self, doc_id: str, chunking: Optional[str] = None) -> Optional[Dict]:
+        for entry in self.files.values():
+            if entry["doc_id"] == doc_id and (chunking is None or entry.get("chunking") == chunking):
+                return entry
+        return None
+
+    def has_doc(self, doc_id: str, chunking: Optional[str] = None) -> bool:
+        return self.find_doc(doc_id, chunking) is not None
+
+    def record(self, pdf_name: str, doc_id: str, chunking: str, chunks: int, tables: int):
+        self.files[pdf_name] = {
+            "doc_id": doc_id,
+            "chunking": chunking,
+            "chunks": chunks,
+            "tables": tables,
+        }
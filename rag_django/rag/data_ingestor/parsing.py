@@ -0,0 +1,323 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+from rag.data_ingestor.chunking import CharacterChunker
+
+# Optional: only import if table extraction is enabled
+try:
+    import pdfplumber
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+# A page is handed to pdfplumber only if its ruling lines form a grid of at
+# least (horizontal, vertical) rules crossing each other. A framed box is
+# only 2 x 2; (4, 2) keeps single-column tables of three or more rows.
+TABLE_GRIDS = ((3, 3), (4, 2))
+# points two rules may be off and still count as aligned / touching
+RULE_TOLERANCE = 2.0
+
+
+class PDFParser:
+    """
+    Turns (a page range of) one PDF into text chunks and table records.
+
+    Holds no models or database handles, so it can be pickled and run in a
+    worker process by FolderPDFIngestor's parallel mode.
+    """
+
+    def __init__(
+        self,
+        chunker=None,
+        extract_tables: bool = False,
+        table_workers: int = 1
+    ):
+        self.extract_tables = extract_tables and PDFPLUMBER_AVAILABLE
+        # >1: run pdfplumber on the candidate pages in a process pool
+        self.table_workers = max(1, table_workers)
+
+        # see rag.data_ingestor.chunking for the available strategies
+        self.chunker = chunker or CharacterChunker(chunk_size=500, chunk_overlap=200)
+
+    @staticmethod
+    def page_count(path: str) -> int:
+        with fitz.open(path) as doc:
+            return doc.page_count
+
+    def parse(
+        self, path: str, first_page: int = 0, last_page: Optional[int] = None
+    ) -> List[Dict]:
+        return self.parse_timed(path, first_page, last_page)[0]
+
+    def parse_timed(
+        self, path: str, first_page: int = 0, last_page: Optional[int] = None
+    ) -> Tuple[List[Dict], Dict]:
+        """
+        Records for pages [first_page, last_page) (0-based): all text
+        chunks of the range first, then its tables.
+        Also returns per-stage seconds and page counters for the range.
+        """
+        timings = {
+            "text_seconds": 0.0,
+            "table_detect_seconds": 0.0,
+            "table_extract_seconds": 0.0,
+            "pages": 0,
+            "table_candidate_pages": 0,
+            "table_pages": 0,
+        }
+        records = []
+
+        pages, table_pages = self.load_pdf(path, first_page, last_page, timings)
+
+        start = time.perf_counter()
+        for page in pages:
+            chunks = self.chunker.split(page["text"])
+
+            for idx, (chunk, extra) in enumerate(chunks):
+                records.append({
+                    "type": "text",
+                    "page": page["page"],
+                    "chunk_index": idx,
+                    "content": chunk,
+                    **extra,
+                })
+        timings["text_seconds"] += time.perf_counter() - start
+
+        if self.extract_tables and table_pages:
+            start = time.perf_counter()
+            tables = self.extract_tables_from(path, table_pages)
+            # candidates that really held a table, to keep the pre-check honest
+            timings["table_pages"] += len({table["page"] for table in tables})
+            for table in tables:
+                records.append({
+                    "type": "table",
+                    "page": table["page"],
+                    "chunk_index": table["table_idx"],
+                    "content": table["searchable"],
+                    "table_markdown": table["markdown"],
+                })
+            timings["table_extract_seconds"] += time.perf_counter() - start
+
+        return records, timings
+
+    def load_pdf(
+        self,
+        path,
+        first_page: int = 0,
+        last_page: Optional[int] = None,
+        timings: Optional[Dict] = None
+    ) -> Tuple[List[Dict], List[int]]:
+        """
+        Page texts of the range plus the 0-based page numbers that look like
+        they hold a table, found in the same PyMuPDF pass.
+        """
+        timings = timings if timings is not None else {}
+        pages = []
+        table_pages = []
+        detect_seconds = 0.0
+
+        start = time.perf_counter()
+        with fitz.open(path) as doc:
+            last_page = doc.page_count if last_page is None else min(last_page, doc.page_count)
+            for i in range(first_page, last_page):
+                page = doc[i]
+                text = page.get_text().strip()
+                if text:
+                    pages.append({"text": text, "page": i + 1})
+
+                if self.extract_tables:
+                    detect_start = time.perf_counter()
+                    if self.has_ruled_table(page):
+                        table_pages.append(i)
+                    detect_seconds += time.perf_counter() - detect_start
+        elapsed = time.perf_counter() - start
+
+        timings["text_seconds"] = timings.get("text_seconds", 0.0) + elapsed - detect_seconds
+        timings["table_detect_seconds"] = timings.get("table_detect_seconds", 0.0) + detect_seconds
+        timings["pages"] = timings.get("pages", 0) + max(0, last_page - first_page)
+        timings["table_candidate_pages"] = timings.get("table_candidate_pages", 0) + len(table_pages)
+
+        return pages, table_pages
+
+    @staticmethod
+    def has_ruled_table(page) -> bool:
+        """
+        Cheap pre-check on an already-open PyMuPDF page.
+        pdfplumber's default ("lines") table strategy only finds tables drawn
+        with ruling lines, and a table worth indexing has at least two rows,
+        so the page needs a grid of rules (see TABLE_GRIDS), not just boxes.
+        """
+        horizontals, verticals = _page_rules(page)
+        if len(horizontals) < 3 or len(verticals) < 2:
+            return False
+
+        crossings = [
+            frozenset(i for i, v in enumerate(verticals) if _crosses(h, v))
+            for h in horizontals
+        ]
+
+        for min_rows, min_cols in TABLE_GRIDS:
+            for h, columns in zip(horizontals, crossings):
+                if len(columns) < min_cols:
+                    continue
+                # distinct rule positions crossing the same columns as h
+                rows = {
+                    round(other[0])
+                    for other, other_columns in zip(horizontals, crossings)
+                    if len(columns & other_columns) >= min_cols
+                }
+                if len(rows) >= min_rows:
+                    return True
+
+        return False
+
+    def extract_tables_from(self, pdf_path: str, page_numbers: List[int]) -> List[Dict]:
+        """Extract tables from the given (0-based) pages using pdfplumber"""
+        if not self.extract_tables or not page_numbers:
+            return []
+
+        if self.table_workers > 1 and len(page_numbers) > 1:
+            # one contiguous share of the pages per worker, so each opens
+            # the PDF once
+            workers = min(self.table_workers, len(page_numbers))
+            share = -(-len(page_numbers) // workers)
+            shares = [page_numbers[i:i + share] for i in range(0, len(page_numbers), share)]
+            with ProcessPoolExecutor(
+                max_workers=len(shares),
+                mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                per_share = executor.map(_extract_tables, [pdf_path] * len(shares), shares)
+                return [table for tables in per_share for table in tables]
+
+        return _extract_tables(pdf_path, page_numbers)
+
+    @staticmethod
+    def table_to_markdown(table: List[List]) -> str:
+        """Convert table to markdown format"""
+        if not table or len(table) < 1:
+            return ""
+
+        headers = table[0]
+        markdown = "| " + " | ".join(str(h) if h else "" for h in headers) + " |\n"
+        markdown += "| " + " | ".join(["---"] * len(headers)) + " |\n"
+
+        for row in table[1:]:
+            markdown += "| " + " | ".join(str(cell) if cell else "" for cell in row) + " |\n"
+
+        return markdown
+
+    @staticmethod
+    def table_to_searchable_text(table: List[List]) -> str:
+        """Create searchable text from table"""
+        if not table or len(table) < 2:
+            return ""
+
+        text_parts = []
+        headers = table[0]
+
+        for row in table[1:]:
+            for idx, cell in enumerate(row):
+                if cell and idx < len(headers) and headers[idx]:
+                    text_parts.append(f"{headers[idx]}: {cell}")
+
+        return " | ".join(text_parts)
+
+
+def _page_rules(page) -> Tuple[List[List[float]], List[List[float]]]:
+    """
+    Ruling lines of a PyMuPDF page as [position, start, end]: horizontals
+    as [y, x0, x1], verticals as [x, y0, y1]. Rectangle edges count as
+    rules; collinear pieces that touch are merged into one.
+    """
+    horizontals, verticals = [], []
+
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            kind = item[0]
+            if kind == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) >= 1:
+                    horizontals.append(((p1.y + p2.y) / 2, min(p1.x, p2.x), max(p1.x, p2.x)))
+                elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) >= 1:
+                    verticals.append(((p1.x + p2.x) / 2, min(p1.y, p2.y), max(p1.y, p2.y)))
+            elif kind in ("re", "qu"):
+                rect = item[1].rect if kind == "qu" else item[1]
+                if rect.height < 2 and rect.width >= 2:
+                    # thin filled rect used as a rule
+                    horizontals.append(((rect.y0 + rect.y1) / 2, rect.x0, rect.x1))
+                elif rect.width < 2 and rect.height >= 2:
+                    verticals.append(((rect.x0 + rect.x1) / 2, rect.y0, rect.y1))
+                elif rect.width >= 2 and rect.height >= 2:
+                    horizontals += [(rect.y0, rect.x0, rect.x1), (rect.y1, rect.x0, rect.x1)]
+                    verticals += [(rect.x0, rect.y0, rect.y1), (rect.x1, rect.y0, rect.y1)]
+
+    return _merge_rules(horizontals), _merge_rules(verticals)
+
+
+def _merge_rules(rules) -> List[List[float]]:
+    merged = []
+    for position, start, end in sorted(rules):
+        last = merged[-1] if merged else None
+        if last and abs(last[0] - position) <= RULE_TOLERANCE and start <= last[2] + RULE_TOLERANCE:
+            last[2] = max(last[2], end)
+        else:
+            merged.append([position, start, end])
+    return merged
+
+
+def _crosses(horizontal: List[float], vertical: List[float]) -> bool:
+    y, x0, x1 = horizontal
+    x, y0, y1 = vertical
+    return (
+        x0 - RULE_TOLERANCE <= x <= x1 + RULE_TOLERANCE
+        and y0 - RULE_TOLERANCE <= y <= y1 + RULE_TOLERANCE
+    )
+
+
+def _extract_tables(pdf_path: str, page_numbers: List[int]) -> List[Dict]:
+    """
+    Tables of the given (0-based) pages, from one pdfplumber open of the
+    file; module level so it can run in a worker process.
+    """
+    tables_data = []
+    # pdfplumber returns the selected pages in document order
+    page_numbers = sorted(page_numbers)
+
+    try:
+        with pdfplumber.open(pdf_path, pages=[page_num + 1 for page_num in page_numbers]) as pdf:
+            for page_num, page in zip(page_numbers, pdf.pages):
+                tables_data.extend(_page_tables(pdf_path, page_num, page))
+    except Exception as e:
+        print(f"Warning: Table extraction failed for {pdf_path}: {e}")
+
+    return tables_data
+
+
+def _page_tables(pdf_path: str, page_num: int, page) -> List[Dict]:
+    tables_data = []
+
+    try:
+        tables = page.extract_tables()
+
+        for table_idx, table in enumerate(tables):
+            if table and len(table) > 0:
+                # Convert to markdown
+                markdown = PDFParser.table_to_markdown(table)
+                # Create searchable text
+                searchable = PDFParser.table_to_searchable_text(table)
+
+                if searchable:  # Only add if has content
+                    tables_data.append({
+                        'page': page_num + 1,
+                        'markdown': markdown,
+                        'searchable': searchable,
+                        'table_idx': table_idx
+                    })
+    except Exception as e:
+        print(f"Warning: Table extraction failed for {pdf_path} page {page_num + 1}: {e}")
+
+    return tables_data
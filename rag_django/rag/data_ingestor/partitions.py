@@ -0,0 +1,156 @@
+from typing import Dict, List
+
+CONTENT_TYPES = ("text", "table")
+
+
+def partition_name(collection_name: str, content_type: str) -> str:
+    """
+    Text keeps the collection's own name, so stores written before the
+    split still have their text where it was; tables live in <name>_tables.
+    """
+    return collection_name if content_type == "text" else f"{collection_name}_{content_type}s"
+
+
+class CollectionPartitions:
+    """
+    One physical Chroma collection per content type.
+
+    Searching only tables (or only text) is then a plain ANN query on a
+    smaller index instead of a metadata-filtered one. Chunks keep their
+    "type" metadata, so the split is invisible to anything reading them.
+    Table chunks left in the text collection by older ingestors are moved
+    over by migrate_legacy(), on open unless migrate=False; given the
+    TableStore it also moves inline table markdown there. It writes, so
+    only a writer holding collection_lock should run it; readers pass
+    migrate=False and migrate under the lock if has_legacy() (see
+    ChromaRetriever), so a store nobody ingests into again is split too.
+    """
+
+    def __init__(self, client, collection_name: str, migrate: bool = True):
+        self.collection_name = collection_name
+        self.collections = {
+            content_type: client.get_or_create_collection(
+                name=partition_name(collection_name, content_type),
+                metadata={"hnsw:space": "cosine"}
+            )
+            for content_type in CONTENT_TYPES
+        }
+        self.migrated = self.migrate_legacy() if migrate else 0
+
+    def __getitem__(self, content_type: str):
+        if content_type not in self.collections:
+            raise ValueError(
+                f"Unknown content type {content_type!r}, expected one of {CONTENT_TYPES}"
+            )
+        return self.collections[content_type]
+
+    def items(self):
+        return self.collections.items()
+
+    def upsert(
+        self,
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        ids: List[str]
+    ):
+        """Write a mixed batch, each chunk to the partition of its "type"."""
+        grouped = {}
+        for row in zip(documents, embeddings, metadatas, ids):
+            grouped.setdefault(row[2]["type"], []).append(row)
+
+        for content_type, rows in grouped.items():
+            part_documents, part_embeddings, part_metadatas, part_ids = map(list, zip(*rows))
+            self[content_type].upsert(
+                documents=part_documents,
+                embeddings=part_embeddings,
+                metadatas=part_metadatas,
+                ids=part_ids
+            )
+
+    def delete(self, where: Dict):
+        for collection in self.collections.values():
+            collection.delete(where=where)
+
+    def has_legacy(self) -> bool:
+        """
+        Whether the text collection still holds table chunks, or table
+        chunks still carry their markdown inline.
+        """
+        if self["text"].get(where={"type": "table"}, limit=1, include=[])["ids"]:
+            return True
+        return any(True for _ in self._inline_tables())
+
+    def _inline_tables(self, batch_size: int = 1000):
+        """(ids, metadatas) batches of table chunks with table_markdown metadata."""
+        tables = self["table"]
+        offset = 0
+
+        while True:
+            batch = tables.get(limit=batch_size, offset=offset, include=["metadatas"])
+            if not batch["ids"]:
+                return
+            offset += len(batch["ids"])
+
+            inline = [
+                (chunk_id, metadata)
+                for chunk_id, metadata in zip(batch["ids"], batch["metadatas"])
+                if "table_markdown" in metadata
+            ]
+            if inline:
+                yield [chunk_id for chunk_id, _ in inline], [metadata for _, metadata in inline]
+
+    def migrate_legacy(self, table_store=None, batch_size: int = 1000) -> int:
+        """
+        Move table chunks out of the text collection and, given the
+        collection's TableStore, their inline markdown into it. Returns how
+        many chunks moved.
+        """
+        moved = self._move_tables(batch_size)
+        if table_store is not None:
+            self._store_inline_tables(table_store, batch_size)
+        return moved
+
+    def _store_inline_tables(self, table_store, batch_size: int):
+        """Replace table_markdown metadata with a table_ref into table_store."""
+        tables = self["table"]
+
+        for ids, metadatas in list(self._inline_tables(batch_size)):
+            # the store first, so every table stays readable either way
+            table_store.put_many(
+                ids,
+                [metadata.get("doc_id", "") for metadata in metadatas],
+                [metadata["table_markdown"] for metadata in metadatas]
+            )
+            # None drops the key from Chroma metadata on update
+            tables.update(
+                ids=ids,
+                metadatas=[
+                    {**metadata, "table_markdown": None, "table_ref": chunk_id}
+                    for chunk_id, metadata in zip(ids, metadatas)
+                ]
+            )
+
+    def _move_tables(self, batch_size: int) -> int:
+        text = self["text"]
+        tables = self["table"]
+        moved = 0
+
+        while True:
+            legacy = text.get(
+                where={"type": "table"},
+                limit=batch_size,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            if not legacy["ids"]:
+                return moved
+
+            # upsert first, so an interrupted migration can simply rerun
+            tables.upsert(
+                ids=legacy["ids"],
+                documents=legacy["documents"],
+                metadatas=legacy["metadatas"],
+                embeddings=legacy["embeddings"]
+            )
+            text.delete(ids=legacy["ids"])
+            moved += len(legacy["ids"])
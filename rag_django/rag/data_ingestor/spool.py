@@ -0,0 +1,67 @@
+import json
+import os
+import sqlite3
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+
+class ChunkSpool:
+    """
+    Parsed and embedded chunks of one work unit, waiting to be written.
+
+    Fan-out ingestion tasks (web.tasks) each fill their own spool file in
+    parallel; a single commit step then copies them into Chroma in order,
+    so only one process ever writes the collection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, "
+            "document TEXT NOT NULL, metadata TEXT NOT NULL, embedding BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    def add(
+        self,
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        ids: List[str]
+    ):
+        self._db.executemany(
+            "INSERT INTO chunks (id, document, metadata, embedding) VALUES (?, ?, ?, ?)",
+            [
+                (chunk_id, document, json.dumps(metadata), array("f", embedding).tobytes())
+                for document, embedding, metadata, chunk_id in zip(documents, embeddings, metadatas, ids)
+            ]
+        )
+        self._db.commit()
+
+    def iter_batches(
+        self, batch_size: int
+    ) -> Iterator[Tuple[List[str], List[List[float]], List[Dict], List[str]]]:
+        """(documents, embeddings, metadatas, ids) in insertion order."""
+        cursor = self._db.execute(
+            "SELECT id, document, metadata, embedding FROM chunks ORDER BY seq"
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield (
+                [row[1] for row in rows],
+                [array("f", row[3]).tolist() for row in rows],
+                [json.loads(row[2]) for row in rows],
+                [row[0] for row in rows],
+            )
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+
+def table_store_path(chroma_dir: str, collection_name: str) -> str:
+    return os.path.join(chroma_dir, f"{collection_name}_tables.sqlite3")
+
+
+class TableStore:
+    """
+    Side store for table markdown, keyed by chunk id.
+
+    Chroma metadata only carries a "table_ref" to the row here, so the
+    (often large) markdown is not copied through every ANN result and is
+    read only for the few tables that survive reranking.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS table_markdown ("
+            "chunk_id TEXT PRIMARY KEY, doc_id TEXT NOT NULL, markdown TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS table_markdown_doc_id ON table_markdown (doc_id)"
+        )
+        self._db.commit()
+
+    def put_many(self, chunk_ids: List[str], doc_ids: List[str], markdowns: List[str]):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO table_markdown (chunk_id, doc_id, markdown) "
+                "VALUES (?, ?, ?)",
+                list(zip(chunk_ids, doc_ids, markdowns))
+            )
+            self._db.commit()
+
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            unique = list(set(chunk_ids))
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT chunk_id, markdown FROM table_markdown "
+                    f"WHERE chunk_id IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def delete_doc(self, doc_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM table_markdown WHERE doc_id = ?", (doc_id,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
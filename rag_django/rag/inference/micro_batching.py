@@ -0,0 +1,188 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    In-process dynamic batching.
+
+    Callers submit items and get Futures back. A single worker thread
+    takes the first waiting item, keeps collecting for up to max_wait_ms
+    (or until max_batch_size items are queued), runs run_batch once on
+    the whole batch and resolves every future. Concurrent requests that
+    arrive within a few milliseconds of each other therefore share one
+    forward pass instead of queueing for the model one by one.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List], Sequence],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 3.0,
+        name: str = "micro-batcher",
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "largest_batch": 0}
+
+    def _ensure_running(self):
+        # started lazily, and restarted in a forked child where the
+        # parent's thread does not exist
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit_many(self, items: Sequence) -> List[Future]:
+        self._ensure_running()
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return futures
+
+    def submit(self, item) -> Future:
+        return self.submit_many([item])[0]
+
+    def map(self, items: Sequence) -> List:
+        """Submit items and block until all of their results are in."""
+        return [future.result() for future in self.submit_many(items)]
+
+    def _collect(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # past the deadline, still take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = [
+                (item, future)
+                for item, future in self._collect()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            try:
+                results = self.run_batch([item for item, _ in batch])
+            except BaseException as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._lock:
+                self._stats["requests"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            batches = self._stats["batches"]
+            return {
+                **self._stats,
+                "mean_batch": self._stats["requests"] / batches if batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
+
+
+class BatchedEmbeddingModel:
+    """
+    Drop-in for SentenceTransformer.encode() that routes texts through a
+    MicroBatcher. Calls with options other than normalize_embeddings go
+    straight to the wrapped model.
+    """
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait_ms: float = 3.0):
+        self.model = model
+        self._batchers = {
+            normalize: MicroBatcher(
+                partial(self._encode, normalize),
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+                name="embed-batcher",
+            )
+            for normalize in (False, True)
+        }
+
+    def _encode(self, normalize: bool, texts: List[str]) -> List:
+        # the same query from two users is embedded once
+        unique = list(dict.fromkeys(texts))
+        vectors = self.model.encode(
+            unique, batch_size=len(unique), normalize_embeddings=normalize
+        )
+        by_text = dict(zip(unique, vectors))
+        return [by_text[text] for text in texts]
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs):
+        if kwargs or isinstance(sentences, str) or not sentences:
+            return self.model.encode(
+                sentences, normalize_embeddings=normalize_embeddings, **kwargs
+            )
+        return np.stack(self._batchers[bool(normalize_embeddings)].map(list(sentences)))
+
+    def stats(self) -> Dict:
+        return {
+            "normalized" if normalize else "raw": batcher.stats()
+            for normalize, batcher in self._batchers.items()
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class BatchedCrossEncoder:
+    """Drop-in for CrossEncoder.predict() over (query, document) pairs."""
+
+    def __init__(self, model, max_batch_size: int = 128, max_wait_ms: float = 3.0):
+        self.model = model
+        self._batcher = MicroBatcher(
+            self._predict,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="rerank-batcher",
+        )
+
+    def _predict(self, pairs: List) -> List:
+        unique = list(dict.fromkeys(pairs))
+        scores = self.model.predict(unique, batch_size=len(unique))
+        by_pair = dict(zip(unique, scores))
+        return [by_pair[pair] for pair in pairs]
+
+    def predict(self, sentences, **kwargs):
+        if kwargs or not sentences:
+            return self.model.predict(sentences, **kwargs)
+        return np.asarray(self._batcher.map([tuple(pair) for pair in sentences]))
+
+    def stats(self) -> Dict:
+        return self._batcher.stats()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
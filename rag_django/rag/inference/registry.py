@@ -0,0 +1,94 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import torch
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.cross_encoder import CrossEncoder
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# "torch": fp32 PyTorch (the old behaviour)
+# "onnx":  ONNX Runtime, needs sentence-transformers[onnx] (>= 3.2 for
+#          embeddings, >= 4.1 for cross-encoders)
+# "int8":  PyTorch with dynamic int8 quantization of the Linear layers
+INFERENCE_BACKENDS = ("torch", "onnx", "int8")
+INFERENCE_BACKEND = os.getenv("RAG_INFERENCE_BACKEND", "torch")
+
+_models: Dict[Tuple[str, str, str], object] = {}
+_lock = threading.Lock()
+
+
+def _check_backend(backend: Optional[str]) -> str:
+    backend = backend or INFERENCE_BACKEND
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend {backend!r}, expected one of {INFERENCE_BACKENDS}"
+        )
+    return backend
+
+
+def model_key(model_name: str, backend: Optional[str] = None) -> str:
+    """
+    Name used to key cached vectors/scores, so results from different
+    backends (int8 is not bit-identical to fp32) are never mixed.
+    """
+    backend = _check_backend(backend)
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def load_embedding_model(model_name: str, backend: str) -> SentenceTransformer:
+    """Always loads a fresh model; use get_embedding_model() to share one."""
+    backend = _check_backend(backend)
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx")
+
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return model
+
+
+def load_cross_encoder(model_name: str, backend: str) -> CrossEncoder:
+    """Always loads a fresh model; use get_cross_encoder() to share one."""
+    backend = _check_backend(backend)
+
+    if backend == "onnx":
+        return CrossEncoder(model_name, device="cpu", backend="onnx")
+
+    model = CrossEncoder(model_name, device="cpu")
+    if backend == "int8":
+        torch.quantization.quantize_dynamic(
+            model.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return model
+
+
+def get_embedding_model(
+    model_name: str = EMBEDDING_MODEL_NAME, backend: Optional[str] = None
+) -> SentenceTransformer:
+    """Process-wide embedding model, shared by the ingestor and the retriever."""
+    backend = _check_backend(backend)
+    key = ("embedding", model_name, backend)
+
+    with _lock:
+        if key not in _models:
+            _models[key] = load_embedding_model(model_name, backend)
+        return _models[key]
+
+
+def get_cross_encoder(
+    model_name: str = RERANKER_MODEL_NAME, backend: Optional[str] = None
+) -> CrossEncoder:
+    """Process-wide cross-encoder."""
+    backend = _check_backend(backend)
+    key = ("cross_encoder", model_name, backend)
+
+    with _lock:
+        if key not in _models:
+            _models[key] = load_cross_encoder(model_name, backend)
+        return _models[key]
@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Rows kept in the SQLite file (db_path); the least recently used tenth is
+# evicted when it grows past this.
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("RAG_QUERY_CACHE_MAX_ENTRIES", "100000"))
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of normalized query text -> normalized embedding.
+
+    Queries are lower-cased and whitespace-collapsed before lookup, so
+    "What is  an Atom?" and "what is an atom?" share one entry (the default
+    MiniLM model is uncased, so the embedding does not change).
+    With db_path set, entries are also written to a small SQLite file so
+    they survive worker restarts; it holds at most max_entries, evicted by
+    last use like ChunkEmbeddingCache. Hits served from memory do not
+    touch the file, so its last use is when a query was stored or last
+    read back from disk.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        db_path: Optional[str] = None,
+        model_name: str = "",
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+    ):
+        self.max_size = max(1, max_size)
+        self.max_entries = max(1, max_entries)
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(query_embeddings)")]
+            if "last_used" not in columns:
+                # files written before the bound: their rows go first
+                self._db.execute(
+                    "ALTER TABLE query_embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0"
+                )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_last_used "
+                "ON query_embeddings (last_used)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _key(self, normalized: str) -> str:
+        return f"{self.model_name}\x00{normalized}"
+
+    def get(self, query: str) -> Optional[List[float]]:
+        key = self._key(self.normalize(query))
+
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT embedding FROM query_embeddings WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE query_embeddings SET last_used = ? WHERE key = ?",
+                        (time.time(), key)
+                    )
+                    self._db.commit()
+                    embedding = array("f", row[0]).tolist()
+                    self._remember(key, embedding)
+                    self.hits += 1
+                    return embedding
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: List[float]):
+        key = self._key(self.normalize(query))
+        embedding = [float(x) for x in embedding]
+
+        with self._lock:
+            self._remember(key, embedding)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, embedding, last_used) "
+                    "VALUES (?, ?, ?)",
+                    (key, array("f", embedding).tobytes(), time.time())
+                )
+                self._evict()
+                self._db.commit()
+
+    def _remember(self, key: str, embedding: List[float]):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        excess = count - self.max_entries + self.max_entries // 10
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            "SELECT key FROM query_embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "persistent": self._db is not None,
+                "max_entries": self.max_entries,
+            }
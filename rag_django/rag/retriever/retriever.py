@@ -1,7 +1,19 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 from sentence_transformers.cross_encoder import CrossEncoder
 from chromadb import PersistentClient
+from rag.data_ingestor.locking import collection_lock
+from rag.data_ingestor.partitions import CollectionPartitions
+from rag.data_ingestor.table_store import TableStore, table_store_path
+from rag.inference.registry import (
+    EMBEDDING_MODEL_NAME,
+    RERANKER_MODEL_NAME,
+    get_cross_encoder,
+    get_embedding_model,
+    model_key,
+)
+from rag.retriever.query_cache import QueryEmbeddingCache
+from rag.retriever.score_cache import RerankScoreCache, get_score_cache
 
 
 class ChromaRetriever:
@@ -10,18 +22,89 @@ class ChromaRetriever:
         self,
         chroma_dir: str,
         collection_name: str,
-        embedding_model_name: str = "all-MiniLM-L6-v2",
-        reranker_model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        embedding_model_name: str = EMBEDDING_MODEL_NAME,
+        reranker_model_name: str = RERANKER_MODEL_NAME,
+        embedding_model: Optional[SentenceTransformer] = None,
+        cross_encoder: Optional[CrossEncoder] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        score_cache: Optional[RerankScoreCache] = None,
+        cascade: bool = False,
+        skip_margin: float = 0.15,
+        candidate_window: float = 0.25,
+        cascade_step: int = 5,
+        stable_stages: int = 1,
     ):
-        self.embedding_model = SentenceTransformer(embedding_model_name)
+        # Already-loaded models can be handed in (see RetrieverPool) so that
+        # opening a collection does not reload them from disk; otherwise the
+        # shared instances from the inference registry are used.
+        self.embedding_model = embedding_model or get_embedding_model(embedding_model_name)
 
+        self.chroma_dir = chroma_dir
+        self.collection_name = collection_name
         self.client = PersistentClient(path=chroma_dir)
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+        # one collection per content type. A store written before the split
+        # is migrated the first time it is opened, under the collection lock
+        # like any other write (the check itself only reads)
+        self.partitions = CollectionPartitions(self.client, collection_name, migrate=False)
+        self.collection = self.partitions["text"]
+        # markdown for table hits, read only after reranking
+        self.table_store = TableStore(table_store_path(chroma_dir, collection_name))
+        if self.partitions.has_legacy():
+            with collection_lock(chroma_dir, collection_name):
+                self.partitions.migrate_legacy(self.table_store)
+
+        self.cross_encoder = cross_encoder or get_cross_encoder(reranker_model_name)
+
+        self.query_cache = query_cache or QueryEmbeddingCache(
+            model_name=model_key(embedding_model_name)
         )
+        # process-wide by default so FolderPDFIngestor can invalidate it
+        self.score_cache = score_cache or get_score_cache()
+
+        # Rerank cascade (see _cascade_rerank). Similarities are 1 - cosine
+        # distance from Chroma.
+        self.cascade = cascade
+        self.skip_margin = skip_margin
+        self.candidate_window = candidate_window
+        self.cascade_step = max(1, cascade_step)
+        self.stable_stages = max(1, stable_stages)
+        self.cascade_stats = {
+            "queries": 0,
+            "reranks_skipped": 0,
+            "rerank_calls": 0,
+            "pairs_scored": 0,
+            "pairs_saved": 0,
+        }
+
+    def close(self):
+        """
+        Close the table store connection. Only for a retriever nobody else
+        is using; RetrieverPool never calls it (see there).
+        """
+        self.table_store.close()
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_queries([query])[0]
 
-        self.cross_encoder = CrossEncoder(reranker_model_name)
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed queries through the query cache; only the misses are
+        sent to the model, in a single encode call.
+        """
+        embeddings = [self.query_cache.get(query) for query in queries]
+
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            encoded = self.embedding_model.encode(
+                [QueryEmbeddingCache.normalize(queries[i]) for i in missing],
+                normalize_embeddings=True
+            ).tolist()
+
+            for i, emb in zip(missing, encoded):
+                self.query_cache.put(queries[i], emb)
+                embeddings[i] = emb
+
+        return embeddings
 
     def retrieve(
         self,
@@ -31,29 +114,107 @@ class ChromaRetriever:
         content_type: Optional[str] = None  
     ) -> List[Dict]:
 
-        query_embedding = self.embedding_model.encode(
-            query,
-            normalize_embeddings=True
-        ).tolist()
+        query_embedding = self.embed_query(query)
+        results = self._query_collection([query_embedding], fetch_k, content_type)
+        retrieved = self._format_results(results)
 
-        where_filter = {"type": content_type} if content_type else None
+        if self.cascade:
+            reranked = self._cascade_rerank(query, retrieved, top_k)
+        else:
+            reranked = self._rerank_with_cross_encoder(
+                query=query,
+                documents=retrieved,
+                top_k=top_k
+            )
 
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=fetch_k,
-            include=["documents", "metadatas", "distances"],
-            where=where_filter
-        )
+        return self._expand_parents(reranked)
 
-        retrieved = self._format_results(results)
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        fetch_k: int = 20,
+        content_type: Optional[str] = None
+    ) -> List[List[Dict]]:
+        """
+        Batched retrieve(): one encode call, one Chroma query and one
+        cross-encoder pass for all queries.
+        Returns one result list per query, each shaped like retrieve().
+        """
+        queries = list(queries)
+        if not queries:
+            return []
 
-        reranked = self._rerank_with_cross_encoder(
-            query=query,
-            documents=retrieved,
-            top_k=top_k
-        )
+        query_embeddings = self.embed_queries(queries)
+        results = self._query_collection(query_embeddings, fetch_k, content_type)
 
-        return reranked
+        retrieved = [
+            self._format_results(results, query_index=i)
+            for i in range(len(queries))
+        ]
+
+        if self.cascade:
+            # skip/shrink per query, then staged like retrieve(), with one
+            # predict call per stage for all queries still going
+            candidates = [self._cascade_candidates(documents, top_k) for documents in retrieved]
+            to_stage = [
+                (query, candidate_docs)
+                for query, candidate_docs in zip(queries, candidates)
+                if candidate_docs is not None
+            ]
+            staged = iter(self._staged_rerank(to_stage, top_k))
+            reranked = [
+                documents[:top_k] if candidate_docs is None else next(staged)
+                for documents, candidate_docs in zip(retrieved, candidates)
+            ]
+        else:
+            scores = self._cross_scores(list(zip(queries, retrieved)))
+            reranked = [
+                self._sort_by_cross_score(documents, query_scores, top_k)
+                for documents, query_scores in zip(retrieved, scores)
+            ]
+
+        return [self._expand_parents(results) for results in reranked]
+
+    def retrieve_routed(
+        self,
+        query: str,
+        routes: Dict[str, int],
+        top_k: int = 5
+    ) -> List[Dict]:
+        """
+        Search several content-type partitions with a single query
+        embedding and rerank the merged candidates once.
+
+        routes maps content type -> fetch_k, e.g. {"text": 20, "table": 10}.
+        Table hits are reranked on their searchable text and then carry
+        the table markdown as "content" (and "markdown") for the LLM.
+        """
+        query_embedding = self.embed_query(query)
+
+        retrieved = []
+        for content_type, fetch_k in routes.items():
+            if fetch_k > 0:
+                results = self._query_collection([query_embedding], fetch_k, content_type)
+                retrieved.extend(self._format_results(results))
+
+        # the cascade reads similarities off the candidate order
+        retrieved.sort(key=lambda doc: doc["vector_score"])
+
+        if self.cascade:
+            reranked = self._cascade_rerank(query, retrieved, top_k)
+        else:
+            reranked = self._rerank_with_cross_encoder(
+                query=query,
+                documents=retrieved,
+                top_k=top_k
+            )
+
+        results = self._expand_parents(reranked)
+        for result in self._load_tables(results):
+            result["content"] = result["markdown"]
+
+        return results
 
     def get_tables(
         self,
@@ -71,28 +232,138 @@ class ChromaRetriever:
             content_type="table"
         )
 
+        tables = []
+        for result in self._load_tables(results):
+            tables.append({
+                "id": result["id"],
+                "markdown": result["markdown"],
+                "source": result["metadata"].get("source", "Unknown"),
+                "page": result["metadata"].get("page", "Unknown"),
+                "score": result.get("cross_score", 0),
+                "content": result["content"]  # searchable text
+            })
+
+        return tables
+
+    def _load_tables(self, results: List[Dict]) -> List[Dict]:
+        """
+        Attach "markdown" to the table results from the table store, with
+        one lookup. Stores written before the side store keep it inline
+        in the metadata. Returns the results that got a table.
+        """
+        refs = [
+            result["metadata"]["table_ref"]
+            for result in results
+            if "table_ref" in result["metadata"]
+        ]
+        stored = self.table_store.get_many(refs) if refs else {}
+
         tables = []
         for result in results:
-            if "table_markdown" in result["metadata"]:
-                tables.append({
-                    "markdown": result["metadata"]["table_markdown"],
-                    "source": result["metadata"].get("source", "Unknown"),
-                    "page": result["metadata"].get("page", "Unknown"),
-                    "score": result.get("cross_score", 0),
-                    "content": result["content"]  # searchable text
-                })
-        
+            metadata = result["metadata"]
+            markdown = metadata.get("table_markdown") or stored.get(metadata.get("table_ref"))
+            if markdown:
+                result["markdown"] = markdown
+                tables.append(result)
+
         return tables
 
-    def _format_results(self, results) -> List[Dict]:
-        documents = results["documents"][0]
-        metadatas = results["metadatas"][0]
-        distances = results["distances"][0]
+    def _expand_parents(self, results: List[Dict]) -> List[Dict]:
+        """
+        For collections chunked with the parent_child strategy: replace each
+        small child hit with its whole page (all siblings, in order) as
+        context, keeping one result per page.
+        """
+        parent_ids = {r["metadata"].get("parent_id") for r in results} - {None}
+        if not parent_ids:
+            return results
+
+        siblings = self.collection.get(
+            where={"parent_id": {"$in": sorted(parent_ids)}},
+            include=["documents", "metadatas"]
+        )
+        pages = {}
+        for doc, meta in zip(siblings["documents"], siblings["metadatas"]):
+            pages.setdefault(meta["parent_id"], []).append((meta["chunk_index"], doc))
+
+        expanded = []
+        seen = set()
+        for result in results:
+            parent_id = result["metadata"].get("parent_id")
+            if parent_id is None:
+                expanded.append(result)
+                continue
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+
+            result["child_content"] = result["content"]
+            children = sorted(pages.get(parent_id, []))
+            if children:
+                result["content"] = "\n".join(doc for _, doc in children)
+            expanded.append(result)
+
+        return expanded
+
+    def _query_collection(
+        self,
+        query_embeddings: List[List[float]],
+        fetch_k: int,
+        content_type: Optional[str] = None
+    ):
+        """
+        Plain ANN search on one partition, or on all of them (merged by
+        distance, fetch_k per query) when content_type is None.
+        """
+        include = ["documents", "metadatas", "distances"]
+        if content_type:
+            return self.partitions[content_type].query(
+                query_embeddings=query_embeddings,
+                n_results=fetch_k,
+                include=include
+            )
+
+        per_partition = [
+            collection.query(
+                query_embeddings=query_embeddings,
+                n_results=fetch_k,
+                include=include
+            )
+            for _, collection in self.partitions.items()
+        ]
+        merged = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for i in range(len(query_embeddings)):
+            rows = sorted(
+                (
+                    row
+                    for results in per_partition
+                    for row in zip(
+                        results["distances"][i],
+                        results["ids"][i],
+                        results["documents"][i],
+                        results["metadatas"][i],
+                    )
+                ),
+                key=lambda row: row[0]
+            )[:fetch_k]
+            merged["distances"].append([row[0] for row in rows])
+            merged["ids"].append([row[1] for row in rows])
+            merged["documents"].append([row[2] for row in rows])
+            merged["metadatas"].append([row[3] for row in rows])
+
+        return merged
+
+    def _format_results(self, results, query_index: int = 0) -> List[Dict]:
+        ids = results["ids"][query_index]
+        documents = results["documents"][query_index]
+        metadatas = results["metadatas"][query_index]
+        distances = results["distances"][query_index]
 
         formatted = []
 
-        for doc, meta, dist in zip(documents, metadatas, distances):
+        for chunk_id, doc, meta, dist in zip(ids, documents, metadatas, distances):
             formatted.append({
+                "id": chunk_id,
                 "content": doc,
                 "metadata": meta,
                 "vector_score": float(dist)
@@ -110,12 +381,153 @@ class ChromaRetriever:
         if not documents:
             return []
 
-        pairs = [
-            (query, doc["content"])
-            for doc in documents
+        scores = self._cross_scores([(query, documents)])[0]
+
+        return self._sort_by_cross_score(documents, scores, top_k)
+
+    def _cascade_candidates(self, documents: List[Dict], top_k: int) -> Optional[List[Dict]]:
+        """
+        First two cascade steps on vector-ordered candidates.
+        Returns None when the vector ranking is decisive (clear similarity
+        gap right after the top_k-th hit), otherwise the candidates within
+        candidate_window of the best hit (never fewer than top_k).
+        """
+        self.cascade_stats["queries"] += 1
+
+        similarities = [1.0 - doc["vector_score"] for doc in documents]
+
+        if len(documents) <= top_k or (
+            similarities[top_k - 1] - similarities[top_k] >= self.skip_margin
+        ):
+            self.cascade_stats["reranks_skipped"] += 1
+            self.cascade_stats["pairs_saved"] += len(documents)
+            return None
+
+        floor = similarities[0] - self.candidate_window
+        keep = max(top_k, sum(1 for sim in similarities if sim >= floor))
+        self.cascade_stats["pairs_saved"] += len(documents) - keep
+        self.cascade_stats["pairs_scored"] += keep
+
+        return documents[:keep]
+
+    def _cascade_rerank(self, query: str, documents: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Adaptive rerank: skip it when the vector ranking is decisive, shrink
+        the candidate list to the hits close to the best one, then score the
+        rest in stages of cascade_step (in vector order) and stop once the
+        top_k set has not changed for stable_stages stages.
+        """
+        if not documents:
+            return []
+
+        candidates = self._cascade_candidates(documents, top_k)
+        if candidates is None:
+            return documents[:top_k]
+
+        return self._staged_rerank([(query, candidates)], top_k)[0]
+
+    def _staged_rerank(
+        self,
+        query_candidates: List[Tuple[str, List[Dict]]],
+        top_k: int
+    ) -> List[List[Dict]]:
+        """
+        Last cascade step for each (query, candidates) group: score the
+        candidates in stages of cascade_step, in vector order, until the
+        group's top_k set has not changed for stable_stages stages. The
+        stages of all groups still going share one cross-encoder call.
+        """
+        # _cascade_candidates counted every kept pair as scored; staging
+        # may stop earlier, which is corrected below
+        groups = [
+            {"query": query, "candidates": candidates, "scored": [], "top": None, "unchanged": 0}
+            for query, candidates in query_candidates
         ]
+        active = [group for group in groups if group["candidates"]]
+
+        while active:
+            stages = []
+            for group in active:
+                position = len(group["scored"])
+                # the first stage must already fill top_k
+                size = max(top_k, self.cascade_step) if position == 0 else self.cascade_step
+                stages.append(group["candidates"][position:position + size])
+
+            scores = self._cross_scores([
+                (group["query"], stage) for group, stage in zip(active, stages)
+            ])
+            self.cascade_stats["rerank_calls"] += 1
+
+            still_active = []
+            for group, stage, stage_scores in zip(active, stages, scores):
+                for doc, score in zip(stage, stage_scores):
+                    doc["cross_score"] = float(score)
+                group["scored"].extend(stage)
+
+                current_top = {
+                    doc["id"]
+                    for doc in sorted(group["scored"], key=lambda x: x["cross_score"], reverse=True)[:top_k]
+                }
+                group["unchanged"] = group["unchanged"] + 1 if current_top == group["top"] else 0
+                group["top"] = current_top
+                if group["unchanged"] < self.stable_stages and len(group["scored"]) < len(group["candidates"]):
+                    still_active.append(group)
+            active = still_active
+
+        reranked = []
+        for group in groups:
+            unscored = len(group["candidates"]) - len(group["scored"])
+            self.cascade_stats["pairs_scored"] -= unscored
+            self.cascade_stats["pairs_saved"] += unscored
+
+            group["scored"].sort(key=lambda x: x["cross_score"], reverse=True)
+            reranked.append(group["scored"][:top_k])
+
+        return reranked
 
-        scores = self.cross_encoder.predict(pairs)
+    def _cross_scores(
+        self,
+        query_documents: List[Tuple[str, List[Dict]]]
+    ) -> List[List[float]]:
+        """
+        Cross-encoder scores for each (query, documents) group.
+        Cached scores are reused; all misses go through one predict call.
+        """
+        scores = []
+        pairs = []
+        missing = []
+
+        for group, (query, documents) in enumerate(query_documents):
+            chunk_ids = [doc["id"] for doc in documents]
+            cached = self.score_cache.get_many(self.collection_name, query, chunk_ids)
+            scores.append(cached)
+
+            for pos, (doc, score) in enumerate(zip(documents, cached)):
+                if score is None:
+                    pairs.append((query, doc["content"]))
+                    missing.append((group, pos))
+
+        if pairs:
+            predicted = self.cross_encoder.predict(pairs)
+            for (group, pos), score in zip(missing, predicted):
+                scores[group][pos] = float(score)
+
+            for group, (query, documents) in enumerate(query_documents):
+                self.score_cache.put_many(
+                    self.collection_name,
+                    query,
+                    [doc["id"] for doc in documents],
+                    scores[group]
+                )
+
+        return scores
+
+    def _sort_by_cross_score(
+        self,
+        documents: List[Dict],
+        scores,
+        top_k: int
+    ) -> List[Dict]:
 
         for doc, score in zip(documents, scores):
             doc["cross_score"] = float(score)
@@ -0,0 +1,100 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class RerankScoreCache:
+    """
+    Bounded LRU cache of cross-encoder scores keyed by
+    (collection, query hash, Chroma chunk id).
+
+    Entries are grouped per collection so an ingestion into one collection
+    can drop its scores without touching anyone else's.
+    """
+
+    def __init__(self, max_size: int = 50000):
+        self.max_size = max(1, max_size)
+        self.hits = 0
+        self.misses = 0
+
+        self._scores: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._by_collection: Dict[str, Set[Tuple[str, str, str]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        # ms-marco MiniLM is uncased, so case and spacing do not change scores
+        normalized = " ".join(query.lower().split())
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def get_many(
+        self, collection: str, query: str, chunk_ids: List[str]
+    ) -> List[Optional[float]]:
+        qhash = self.query_hash(query)
+        found = []
+
+        with self._lock:
+            for chunk_id in chunk_ids:
+                key = (collection, qhash, chunk_id)
+                score = self._scores.get(key)
+                if score is None:
+                    self.misses += 1
+                else:
+                    self._scores.move_to_end(key)
+                    self.hits += 1
+                found.append(score)
+
+        return found
+
+    def put_many(
+        self, collection: str, query: str, chunk_ids: List[str], scores: List[float]
+    ):
+        qhash = self.query_hash(query)
+
+        with self._lock:
+            keys = self._by_collection.setdefault(collection, set())
+            for chunk_id, score in zip(chunk_ids, scores):
+                key = (collection, qhash, chunk_id)
+                self._scores[key] = float(score)
+                self._scores.move_to_end(key)
+                keys.add(key)
+
+            while len(self._scores) > self.max_size:
+                key, _ = self._scores.popitem(last=False)
+                self._forget(key)
+
+    def _forget(self, key: Tuple[str, str, str]):
+        keys = self._by_collection.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_collection[key[0]]
+
+    def invalidate(self, collection: str) -> int:
+        with self._lock:
+            keys = self._by_collection.pop(collection, set())
+            for key in keys:
+                self._scores.pop(key, None)
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._scores),
+                "max_size": self.max_size,
+            }
+
+
+_score_cache = None
+
+
+def get_score_cache() -> RerankScoreCache:
+    global _score_cache
+    if _score_cache is None:
+        _score_cache = RerankScoreCache()
+    return _score_cache
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Cosine similarity a new question needs with a cached one to reuse its answer.
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "256"))
+
+
+class SemanticAnswerCache:
+    """
+    Per-collection cache of generated answers.
+
+    A cached answer is reused when the new question's (normalized) embedding
+    is within `threshold` cosine similarity of a cached question AND the
+    retriever returned the same chunk ids, so the LLM would see the same
+    context. Entries expire after `ttl_seconds` and each collection keeps at
+    most `max_entries` in LRU order.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_SIZE,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+
+        self._collections: Dict[str, "OrderedDict[int, Dict]"] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(
+        self, collection: str, embedding: List[float], chunk_ids: List[str]
+    ) -> Optional[Dict]:
+        chunk_ids = tuple(chunk_ids)
+        now = time.monotonic()
+
+        with self._lock:
+            entries = self._collections.get(collection)
+            best_id = None
+            best_similarity = self.threshold
+
+            if entries:
+                for entry_id in list(entries):
+                    entry = entries[entry_id]
+                    if now - entry["created"] > self.ttl_seconds:
+                        del entries[entry_id]
+                        continue
+                    if entry["chunk_ids"] != chunk_ids:
+                        continue
+
+                    similarity = sum(a * b for a, b in zip(embedding, entry["embedding"]))
+                    if similarity >= best_similarity:
+                        best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            entries.move_to_end(best_id)
+            self.hits += 1
+            answer = entries[best_id]["answer"]
+
+        return {"answer": answer["answer"], "sources": list(answer["sources"])}
+
+    def store(
+        self, collection: str, embedding: List[float], chunk_ids: List[str], answer: Dict
+    ):
+        with self._lock:
+            entries = self._collections.setdefault(collection, OrderedDict())
+            entries[self._next_id] = {
+                "embedding": list(embedding),
+                "chunk_ids": tuple(chunk_ids),
+                "answer": {"answer": answer["answer"], "sources": list(answer["sources"])},
+                "created": time.monotonic(),
+            }
+            self._next_id += 1
+
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, collection: str) -> int:
+        with self._lock:
+            return len(self._collections.pop(collection, {}))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "collections": len(self._collections),
+                "entries": sum(len(e) for e in self._collections.values()),
+            }
+
+
+_answer_cache = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache()
+    return _answer_cache
@@ -0,0 +1,194 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.cross_encoder import CrossEncoder
+
+from rag.data_ingestor.manifest import collection_version
+from rag.inference.micro_batching import BatchedCrossEncoder, BatchedEmbeddingModel
+from rag.inference.registry import (
+    EMBEDDING_MODEL_NAME,
+    RERANKER_MODEL_NAME,
+    get_cross_encoder,
+    get_embedding_model,
+    model_key,
+)
+from rag.retriever.query_cache import QueryEmbeddingCache
+from rag.retriever.retriever import ChromaRetriever
+from rag.retriever.score_cache import get_score_cache
+
+# How many user collections stay open at once before the least recently
+# used one is dropped.
+MAX_OPEN_COLLECTIONS = int(os.getenv("RAG_MAX_OPEN_COLLECTIONS", "8"))
+
+# Query embeddings do not depend on the collection, so one cache is shared
+# by every pooled retriever. Set RAG_QUERY_CACHE_PATH to keep it on disk.
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_PATH = os.getenv("RAG_QUERY_CACHE_PATH")
+
+# Adaptive rerank cascade (ChromaRetriever._cascade_rerank), off by default.
+RERANK_CASCADE = {
+    "cascade": os.getenv("RAG_RERANK_CASCADE", "0") == "1",
+    "skip_margin": float(os.getenv("RAG_CASCADE_SKIP_MARGIN", "0.15")),
+    "candidate_window": float(os.getenv("RAG_CASCADE_WINDOW", "0.25")),
+    "cascade_step": int(os.getenv("RAG_CASCADE_STEP", "5")),
+    "stable_stages": int(os.getenv("RAG_CASCADE_STABLE_STAGES", "1")),
+}
+
+# Cross-request micro-batching of query embeddings and rerank pairs (see
+# rag.inference.micro_batching). Each request may wait up to max_wait_ms
+# for others to join its forward pass.
+MICRO_BATCHING = {
+    "enabled": os.getenv("RAG_MICRO_BATCHING", "1") == "1",
+    "embed_batch_size": int(os.getenv("RAG_MICRO_BATCH_EMBED_SIZE", "64")),
+    "rerank_batch_size": int(os.getenv("RAG_MICRO_BATCH_RERANK_SIZE", "128")),
+    "max_wait_ms": float(os.getenv("RAG_MICRO_BATCH_WAIT_MS", "3")),
+}
+
+
+class RetrieverPool:
+    """
+    Process-wide cache of ChromaRetriever objects.
+
+    The embedding model and the cross-encoder come from the inference
+    registry (so the backend follows RAG_INFERENCE_BACKEND) and are shared
+    by every retriever, behind micro-batchers unless RAG_MICRO_BATCHING=0; open collections are kept in LRU order keyed by
+    (chroma_dir, collection_name) and dropped when the pool is over budget.
+
+    Dropped retrievers are never closed here: a request on another thread
+    may still be inside retrieve() with one, so it stays usable until the
+    last reference goes and garbage collection releases its handles.
+    """
+
+    def __init__(
+        self,
+        max_size: int = MAX_OPEN_COLLECTIONS,
+        embedding_model_name: str = EMBEDDING_MODEL_NAME,
+        reranker_model_name: str = RERANKER_MODEL_NAME,
+    ):
+        self.max_size = max(1, max_size)
+        self.embedding_model_name = embedding_model_name
+        self.reranker_model_name = reranker_model_name
+
+        self._embedding_model: Optional[SentenceTransformer] = None
+        self._cross_encoder: Optional[CrossEncoder] = None
+        self.query_cache = QueryEmbeddingCache(
+            max_size=QUERY_CACHE_SIZE,
+            db_path=QUERY_CACHE_PATH,
+            model_name=model_key(embedding_model_name),
+        )
+        self._retrievers: "OrderedDict[Tuple[str, str], ChromaRetriever]" = OrderedDict()
+        # collection version last seen per key, kept after the retriever is
+        # dropped so a reopen can tell whether the collection changed (see get())
+        self._versions: Dict[Tuple[str, str], int] = {}
+        # called with the collection name when a collection changed on disk
+        self.on_stale: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+
+    def _load_models(self):
+        if self._embedding_model is None:
+            self._embedding_model = get_embedding_model(self.embedding_model_name)
+            if MICRO_BATCHING["enabled"]:
+                self._embedding_model = BatchedEmbeddingModel(
+                    self._embedding_model,
+                    max_batch_size=MICRO_BATCHING["embed_batch_size"],
+                    max_wait_ms=MICRO_BATCHING["max_wait_ms"],
+                )
+        if self._cross_encoder is None:
+            self._cross_encoder = get_cross_encoder(self.reranker_model_name)
+            if MICRO_BATCHING["enabled"]:
+                self._cross_encoder = BatchedCrossEncoder(
+                    self._cross_encoder,
+                    max_batch_size=MICRO_BATCHING["rerank_batch_size"],
+                    max_wait_ms=MICRO_BATCHING["max_wait_ms"],
+                )
+
+    def get(self, chroma_dir: str, collection_name: str) -> ChromaRetriever:
+        key = (os.path.normpath(chroma_dir), collection_name)
+
+        # ingestion may have run in another process (a Celery worker), so
+        # compare the on-disk version instead of waiting for invalidate()
+        version = collection_version(chroma_dir, collection_name)
+
+        with self._lock:
+            retriever = self._retrievers.get(key)
+            seen_version = self._versions.get(key)
+            if retriever is not None and seen_version == version:
+                self._retrievers.move_to_end(key)
+                return retriever
+
+            self._retrievers.pop(key, None)
+            # also when the retriever was evicted meanwhile: chunk ids are
+            # reused across a rechunk, so scores and answers cached for
+            # the old content would still match
+            if seen_version is not None and seen_version != version:
+                get_score_cache().invalidate(collection_name)
+                for callback in self.on_stale:
+                    callback(collection_name)
+
+            self._load_models()
+            retriever = ChromaRetriever(
+                chroma_dir=chroma_dir,
+                collection_name=collection_name,
+                embedding_model=self._embedding_model,
+                cross_encoder=self._cross_encoder,
+                query_cache=self.query_cache,
+                **RERANK_CASCADE,
+            )
+            self._retrievers[key] = retriever
+            self._versions[key] = version
+
+            while len(self._retrievers) > self.max_size:
+                # its version stays in _versions (see above)
+                self._retrievers.popitem(last=False)
+
+            return retriever
+
+    def invalidate(self, chroma_dir: str, collection_name: str) -> bool:
+        """
+        Drop the pooled retriever for a collection, e.g. after an ingestion
+        finished writing to it. The next get() reopens it.
+        """
+        key = (os.path.normpath(chroma_dir), collection_name)
+
+        with self._lock:
+            retriever = self._retrievers.pop(key, None)
+
+        return retriever is not None
+
+    def _cascade_totals(self) -> Dict:
+        totals = {}
+        for retriever in self._retrievers.values():
+            for key, value in retriever.cascade_stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def _micro_batching_stats(self) -> Dict:
+        stats = {}
+        for key, model in (("embedding", self._embedding_model), ("rerank", self._cross_encoder)):
+            if isinstance(model, (BatchedEmbeddingModel, BatchedCrossEncoder)):
+                stats[key] = model.stats()
+        return stats
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "open_collections": len(self._retrievers),
+                "max_size": self.max_size,
+                "models_loaded": self._embedding_model is not None,
+                "query_cache": self.query_cache.stats(),
+                "rerank_cascade": self._cascade_totals(),
+                "micro_batching": self._micro_batching_stats(),
+            }
+
+
+_retriever_pool = None
+
+
+def get_retriever_pool() -> RetrieverPool:
+    global _retriever_pool
+    if _retriever_pool is None:
+        _retriever_pool = RetrieverPool()
+    return _retriever_pool
@@ -1,9 +1,65 @@
-from rag.retriever.retriever import ChromaRetriever
 from rag.ans_builder.beautify_answer import AnswerBeautifier
+from rag.services.answer_cache import get_answer_cache
+from rag.services.retriever_pool import get_retriever_pool
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 
 beautifier = AnswerBeautifier()
 
+# Embedding, Chroma search and cross-encoder scoring are CPU bound; the async
+# path runs them here so the event loop only waits on them. The bound keeps
+# concurrent requests from oversubscribing the CPU.
+INFERENCE_WORKERS = int(os.getenv("RAG_INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+_inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_WORKERS,
+    thread_name_prefix="rag-inference"
+)
+
+# Content types searched for every question and how many candidates each
+# contributes before the single rerank, e.g. "text:20,table:10". Set a
+# type to 0 (or leave it out) to stop searching it.
+QUERY_ROUTES = {
+    content_type.strip(): int(fetch_k)
+    for content_type, fetch_k in (
+        route.split(":")
+        for route in os.getenv("RAG_QUERY_ROUTES", "text:20,table:10").split(",")
+        if route.strip()
+    )
+}
+
+
+def get_chroma_dir(doc_id: str) -> str:
+    return os.path.join("vector_store", doc_id)
+
+
+def invalidate_collection(doc_id: str):
+    """
+    Hook for ingestion: drop everything cached for a collection once new
+    chunks have been written to it.
+    """
+    get_retriever_pool().invalidate(get_chroma_dir(doc_id), doc_id)
+    get_answer_cache().invalidate(doc_id)
+
+
+# a collection rewritten by a Celery worker makes its cached answers stale too
+get_retriever_pool().on_stale.append(get_answer_cache().invalidate)
+
+
+def _retrieve(question: str, doc_id: str):
+    retriever = get_retriever_pool().get(
+        chroma_dir=get_chroma_dir(doc_id),
+        collection_name=doc_id
+    )
+    # one embedding, text and table candidates reranked together
+    results = retriever.retrieve_routed(
+        query=question,
+        routes=QUERY_ROUTES,
+        top_k=5
+    )
+
+    return retriever, results
+
 
 def ask_rag(question: str, doc_id: str):
     if not doc_id:
@@ -12,23 +68,7 @@ def ask_rag(question: str, doc_id: str):
             "sources": []
         }
     
-    retriever = ChromaRetriever(
-        chroma_dir= os.path.join("vector_store", doc_id),
-        collection_name=doc_id
-    )
-    for_table = ["table", "tables"]
-    for word in for_table:
-        if word in question.lower():
-            results = retriever.get_tables(
-                query= question
-            )
-    else:
-        results = retriever.retrieve(
-            query=question,
-            fetch_k=20,
-            top_k=5, 
-            content_type="text"
-        )
+    retriever, results = _retrieve(question, doc_id)
 
     if not results:
         return {
@@ -39,9 +79,165 @@ def ask_rag(question: str, doc_id: str):
     # for result in results:
     #     print(f"\n Retrieved doc : {result['content'][:200]}")
 
+    # same context + near-identical question -> reuse the stored answer
+    answer_cache = get_answer_cache()
+    question_embedding = retriever.embed_query(question)
+    chunk_ids = [result["id"] for result in results]
+
+    cached = answer_cache.lookup(doc_id, question_embedding, chunk_ids)
+    if cached is not None:
+        return cached
+
     beautified_answer = beautifier.generate_answer(
         question=question,
         top_documents=results
     )
+    answer_cache.store(doc_id, question_embedding, chunk_ids, beautified_answer)
     # print(f"\n beautified_answer : {beautified_answer}\n")
     return beautified_answer
+
+
+def _retrieve_with_embedding(question: str, doc_id: str):
+    retriever, results = _retrieve(question, doc_id)
+    question_embedding = retriever.embed_query(question) if results else None
+    return results, question_embedding
+
+
+async def aask_rag(question: str, doc_id: str):
+    """
+    Async ask_rag: retrieval runs on the bounded inference executor and the
+    Gemini call is awaited natively.
+    """
+    if not doc_id:
+        return {
+            "answer": "No session found. Please upload documents first.",
+            "sources": []
+        }
+
+    loop = asyncio.get_running_loop()
+    results, question_embedding = await loop.run_in_executor(
+        _inference_executor, _retrieve_with_embedding, question, doc_id
+    )
+
+    if not results:
+        return {
+            "answer": "No relevant information found.",
+            "sources": []
+        }
+
+    answer_cache = get_answer_cache()
+    chunk_ids = [result["id"] for result in results]
+
+    cached = answer_cache.lookup(doc_id, question_embedding, chunk_ids)
+    if cached is not None:
+        return cached
+
+    beautified_answer = await beautifier.agenerate_answer(
+        question=question,
+        top_documents=results
+    )
+    answer_cache.store(doc_id, question_embedding, chunk_ids, beautified_answer)
+    return beautified_answer
+
+
+def ask_rag_stream(question: str, doc_id: str, answer_builder: AnswerBeautifier = None):
+    """
+    Streaming ask_rag: yields {"sources": [...]} first, then
+    {"delta": "..."} pieces of the answer, then {"done": True}.
+    """
+    answer_builder = answer_builder or beautifier
+
+    if not doc_id:
+        yield {"sources": []}
+        yield {"delta": "No session found. Please upload documents first."}
+        yield {"done": True}
+        return
+
+    retriever, results = _retrieve(question, doc_id)
+
+    if not results:
+        yield {"sources": []}
+        yield {"delta": "No relevant information found."}
+        yield {"done": True}
+        return
+
+    answer_cache = get_answer_cache()
+    question_embedding = retriever.embed_query(question)
+    chunk_ids = [result["id"] for result in results]
+
+    cached = answer_cache.lookup(doc_id, question_embedding, chunk_ids)
+    if cached is not None:
+        yield {"sources": cached["sources"]}
+        yield {"delta": cached["answer"]}
+        yield {"done": True}
+        return
+
+    sources = []
+    answer_parts = []
+    for event in answer_builder.stream_answer(question=question, top_documents=results):
+        if "sources" in event:
+            sources = event["sources"]
+        else:
+            answer_parts.append(event["delta"])
+        yield event
+
+    answer_cache.store(
+        doc_id,
+        question_embedding,
+        chunk_ids,
+        {"answer": "".join(answer_parts).strip(), "sources": sources}
+    )
+    yield {"done": True}
+
+
+async def aask_rag_stream(question: str, doc_id: str, answer_builder: AnswerBeautifier = None):
+    """
+    Async ask_rag_stream, same frames: retrieval runs on the inference
+    executor and Gemini's stream is awaited, so under ASGI every frame is
+    sent as soon as it exists.
+    """
+    answer_builder = answer_builder or beautifier
+
+    if not doc_id:
+        yield {"sources": []}
+        yield {"delta": "No session found. Please upload documents first."}
+        yield {"done": True}
+        return
+
+    loop = asyncio.get_running_loop()
+    results, question_embedding = await loop.run_in_executor(
+        _inference_executor, _retrieve_with_embedding, question, doc_id
+    )
+
+    if not results:
+        yield {"sources": []}
+        yield {"delta": "No relevant information found."}
+        yield {"done": True}
+        return
+
+    answer_cache = get_answer_cache()
+    chunk_ids = [result["id"] for result in results]
+
+    cached = answer_cache.lookup(doc_id, question_embedding, chunk_ids)
+    if cached is not None:
+        yield {"sources": cached["sources"]}
+        yield {"delta": cached["answer"]}
+        yield {"done": True}
+        return
+
+    sources = []
+    answer_parts = []
+    async for event in answer_builder.astream_answer(question=question, top_documents=results):
+        if "sources" in event:
+            sources = event["sources"]
+        else:
+            answer_parts.append(event["delta"])
+        yield event
+
+    answer_cache.store(
+        doc_id,
+        question_embedding,
+        chunk_ids,
+        {"answer": "".join(answer_parts).strip(), "sources": sources}
+    )
+    yield {"done": True}
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rag_django.settings")
 
@@ -7,4 +8,17 @@ app = Celery("rag_django")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
-app.conf.worker_pool = "solo" 
+
+@worker_process_init.connect
+def preload_models(**kwargs):
+    """
+    Load the embedding model once per worker process, before the first
+    task, instead of inside it. Torch threads are split between the
+    worker processes so they do not oversubscribe the CPU.
+    """
+    import torch
+    from rag.data_ingestor.embedding import get_embedding_model
+
+    concurrency = app.conf.worker_concurrency or os.cpu_count() or 1
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // concurrency))
+    get_embedding_model()
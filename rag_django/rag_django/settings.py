@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -32,9 +33,63 @@ LOGIN_REDIRECT_URL = "/dashboard/"
 LOGOUT_REDIRECT_URL = "/login/"
 
 
-CELERY_BROKER_URL = "redis://localhost:6379/0"
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+# Ingestion workers. prefork runs CELERY_WORKER_CONCURRENCY processes, each
+# with its own preloaded embedding model (see rag_django/celery.py).
+CELERY_WORKER_POOL = os.getenv("CELERY_WORKER_POOL", "prefork")
+CELERY_WORKER_CONCURRENCY = int(os.getenv("CELERY_WORKER_CONCURRENCY", "2"))
+# ingestion tasks are long, don't let one worker hoard queued jobs
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# CELERY_TASK_ALWAYS_EAGER=1 runs .delay() inline (tests, no broker needed)
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "0") == "1"
+CELERY_TASK_EAGER_PROPAGATES = True
+# fan-out ingestion joins its subtasks with a chord, which needs a backend
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
+
+
+# Chunking used by web.tasks for uploads.
+# strategy: "character", "token", "sentence" or "parent_child"
+# (see rag/data_ingestor/chunking.py); sizes are characters, or tokens for "token".
+RAG_CHUNKING = {
+    "strategy": "character",
+    "chunk_size": 500,
+    "chunk_overlap": 200,
+}
+
+# Ingestion progress is pushed to /dashboard/status/<id>/events/ (SSE).
+# channel: "redis" (pub/sub, workers in other processes) or "inprocess"
+# (eager Celery, tests). Updates are coalesced to one per interval seconds.
+RAG_PROGRESS = {
+    "channel": os.getenv("RAG_PROGRESS_CHANNEL", "redis"),
+    "redis_url": os.getenv("RAG_PROGRESS_REDIS_URL", CELERY_BROKER_URL),
+    "interval": float(os.getenv("RAG_PROGRESS_INTERVAL", "1.0")),
+}
+
+# Uploads spanning more than one page range are indexed by one Celery
+# subtask per range of pages_per_task pages, joined by a commit task
+# (see web/tasks.py).
+RAG_INGEST_FANOUT = {
+    "enabled": os.getenv("RAG_INGEST_FANOUT", "1") == "1",
+    "pages_per_task": int(os.getenv("RAG_FANOUT_PAGES_PER_TASK", "40")),
+}
+
+# failed ingestions are re-queued and resume from their checkpoint;
+# running jobs without an update (heartbeat) for stale_after seconds are
+# treated as lost (worker killed) and recovered the same way
+RAG_INGEST_RECOVERY = {
+    "max_attempts": int(os.getenv("RAG_INGEST_MAX_ATTEMPTS", "3")),
+    "retry_delay": int(os.getenv("RAG_INGEST_RETRY_DELAY", "30")),
+    "stale_after": int(os.getenv("RAG_INGEST_STALE_AFTER", "900")),
+}
+# needs `celery -A rag_django beat`; `manage.py recover_ingestions` does the same once
+CELERY_BEAT_SCHEDULE = {
+    "recover-stale-ingestions": {
+        "task": "web.tasks.recover_stale_ingestions_task",
+        "schedule": 300.0,
+    },
+}
 
 
 # Application definition
@@ -80,6 +135,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'rag_django.wsgi.application'
+ASGI_APPLICATION = 'rag_django.asgi.application'
 
 
 # Database
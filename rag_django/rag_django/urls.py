@@ -22,6 +22,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
 
     path("ask/", web_views.ask, name='ask'),
+    path("ask/stream/", web_views.ask_stream, name='ask_stream'),
 
     path("", include("accounts.urls")),
     path('dashboard/', include('web.urls'), name='dashboard'),
@@ -0,0 +1,44 @@
+import os
+
+from chromadb import PersistentClient
+from django.core.management.base import BaseCommand
+
+from rag.data_ingestor.locking import collection_lock
+from rag.data_ingestor.partitions import CollectionPartitions
+from rag.data_ingestor.table_store import TableStore, table_store_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Split collections written before text and tables had their own Chroma "
+        "collections, and move inline table markdown into the table store."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--root",
+            default="vector_store",
+            help="directory holding one Chroma store per collection"
+        )
+        parser.add_argument(
+            "--collection",
+            action="append",
+            help="only this collection (repeatable); default: every store under --root"
+        )
+
+    def handle(self, *args, **options):
+        root = options["root"]
+        names = options["collection"] or sorted(
+            name for name in os.listdir(root)
+            # _spool, _embedding_cache.sqlite3, ...
+            if not name.startswith("_") and os.path.isfile(os.path.join(root, name, "chroma.sqlite3"))
+        )
+
+        for name in names:
+            chroma_dir = os.path.join(root, name)
+            with collection_lock(chroma_dir, name):
+                partitions = CollectionPartitions(PersistentClient(path=chroma_dir), name, migrate=False)
+                table_store = TableStore(table_store_path(chroma_dir, name))
+                moved = partitions.migrate_legacy(table_store)
+                table_store.close()
+            self.stdout.write(f"{name}: moved {moved} table chunks")
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from web.tasks import recover_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Queue again ingestion jobs left running by a lost worker; they resume from their checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=settings.RAG_INGEST_RECOVERY["stale_after"],
+            help="seconds without a progress update before a job counts as lost"
+        )
+        parser.add_argument(
+            "--failed",
+            action="store_true",
+            help="also retry failed jobs whose uploads are still staged"
+        )
+
+    def handle(self, *args, **options):
+        queued = recover_stale_jobs(options["stale_after"], include_failed=options["failed"])
+        self.stdout.write(f"queued {len(queued)} jobs: {queued}")
@@ -15,5 +15,15 @@ class IngestionJob(models.Model):
     )
     progress = models.IntegerField(default=0)
     message = models.TextField(blank=True)
+    # per-stage counters, pushed to the dashboard by web.progress
+    pages_total = models.IntegerField(default=0)
+    pages_parsed = models.IntegerField(default=0)
+    chunks_embedded = models.IntegerField(default=0)
+    chunks_written = models.IntegerField(default=0)
+    # what a retried or recovered run needs to resume (web.tasks)
+    folder_path = models.CharField(max_length=500, blank=True)
+    collection_name = models.CharField(max_length=255, blank=True)
+    checkpoint = models.JSONField(default=dict, blank=True)
+    attempts = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,213 @@
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import IngestionJob
+
+STAGE_FIELDS = ("pages_parsed", "chunks_embedded", "chunks_written")
+FINISHED = ("completed", "failed")
+
+
+def job_snapshot(job: IngestionJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "stages": {
+            "pages_total": job.pages_total,
+            "pages_parsed": job.pages_parsed,
+            "chunks_embedded": job.chunks_embedded,
+            "chunks_written": job.chunks_written,
+        },
+    }
+
+
+class InProcessSubscription:
+    def __init__(self, channel: "InProcessProgressChannel", job_id: int):
+        self.channel = channel
+        self.job_id = job_id
+        self.queue: "queue.Queue" = queue.Queue()
+
+    def get(self, timeout: float) -> Optional[Dict]:
+        """Next event, or None if nothing arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.channel._unsubscribe(self)
+
+
+class InProcessProgressChannel:
+    """
+    Publisher and subscribers in the same process: eager Celery, tests and
+    single-process development servers.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, List[InProcessSubscription]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, job_id: int, event: Dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for subscription in subscribers:
+            subscription.queue.put(event)
+
+    def subscribe(self, job_id: int) -> InProcessSubscription:
+        subscription = InProcessSubscription(self, job_id)
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: InProcessSubscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.job_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.job_id, None)
+
+
+class RedisSubscription:
+    def __init__(self, client, channel_name: str):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        # subscribed before the caller reads the current state, so no
+        # event published in between is lost
+        self.pubsub.subscribe(channel_name)
+
+    def get(self, timeout: float) -> Optional[Dict]:
+        message = self.pubsub.get_message(timeout=timeout)
+        return json.loads(message["data"]) if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisProgressChannel:
+    """Redis pub/sub, for Celery workers in other processes or hosts."""
+
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _channel_name(job_id: int) -> str:
+        return f"rag:ingestion:{job_id}"
+
+    def publish(self, job_id: int, event: Dict):
+        self.client.publish(self._channel_name(job_id), json.dumps(event))
+
+    def subscribe(self, job_id: int) -> RedisSubscription:
+        return RedisSubscription(self.client, self._channel_name(job_id))
+
+
+_channel = None
+_channel_lock = threading.Lock()
+
+
+def get_progress_channel():
+    global _channel
+    with _channel_lock:
+        if _channel is None:
+            if settings.RAG_PROGRESS["channel"] == "inprocess":
+                _channel = InProcessProgressChannel()
+            else:
+                _channel = RedisProgressChannel(settings.RAG_PROGRESS["redis_url"])
+        return _channel
+
+
+class ProgressReporter:
+    """
+    Coalesces stage updates for one job.
+
+    Callers report deltas (stage("chunks_embedded", 64)) as often as they
+    like, from any thread; at most once per interval they are added to the
+    job row with F() expressions (so fan-out subtasks can report into the
+    same job) and the resulting job state is published on the channel.
+    Flushes only run on the thread that created the reporter, so the
+    ingestor's parse/write threads never open database connections.
+    The ingestor's checkpoint goes out with the same flushes.
+    """
+
+    def __init__(self, job_id: int, channel=None, interval: Optional[float] = None):
+        self.job_id = job_id
+        self.channel = channel or get_progress_channel()
+        self.interval = settings.RAG_PROGRESS["interval"] if interval is None else interval
+
+        self._deltas = {field: 0 for field in STAGE_FIELDS}
+        self._progress = None
+        self._progress_delta = 0
+        self._checkpoint = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._owner = threading.get_ident()
+
+    def stage(self, name: str, count: int):
+        with self._lock:
+            self._deltas[name] += count
+        self._maybe_flush()
+
+    def set_progress(self, value: int):
+        with self._lock:
+            self._progress = value
+        self._maybe_flush()
+
+    def add_progress(self, value: int):
+        with self._lock:
+            self._progress_delta += value
+        self._maybe_flush()
+
+    def checkpoint(self, state: Dict):
+        with self._lock:
+            self._checkpoint = state
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if threading.get_ident() != self._owner:
+            return
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self, **fields) -> Dict:
+        """
+        Write pending deltas plus any explicit fields (status, message...)
+        and publish the job's state. Returns that state.
+        """
+        with self._lock:
+            updates = {
+                name: F(name) + delta
+                for name, delta in self._deltas.items()
+                if delta
+            }
+            if self._progress is not None:
+                updates["progress"] = self._progress
+            elif self._progress_delta:
+                updates["progress"] = F("progress") + self._progress_delta
+            if self._checkpoint is not None:
+                updates["checkpoint"] = self._checkpoint
+            updates.update(fields)
+
+            self._deltas = {field: 0 for field in STAGE_FIELDS}
+            self._progress = None
+            self._progress_delta = 0
+            self._checkpoint = None
+            self._last_flush = time.monotonic()
+
+            if updates:
+                IngestionJob.objects.filter(id=self.job_id).update(
+                    updated_at=timezone.now(), **updates
+                )
+            snapshot = job_snapshot(IngestionJob.objects.get(id=self.job_id))
+
+        self.channel.publish(self.job_id, snapshot)
+        return snapshot
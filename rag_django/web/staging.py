@@ -0,0 +1,50 @@
+import json
+import os
+import shutil
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+# written next to the staged files; lists exactly what was uploaded
+UPLOAD_MANIFEST = "upload.json"
+
+
+def staging_dir(username: str, job_id: int) -> str:
+    return os.path.join(settings.MEDIA_ROOT, "uploads", username, str(job_id))
+
+
+def stage_uploads(username: str, job_id: int, files) -> str:
+    """
+    Save one upload into its own directory, media/uploads/<user>/<job id>/,
+    with a manifest of the saved names. Returns the directory.
+    """
+    directory = staging_dir(username, job_id)
+    fs = FileSystemStorage(location=directory)
+    # save() may rename on a clash, so record what it actually wrote
+    names = [fs.save(f.name, f) for f in files]
+
+    manifest_path = os.path.join(directory, UPLOAD_MANIFEST)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"job_id": job_id, "user": username, "files": names}, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    return directory
+
+
+def staged_files(directory: str) -> Optional[List[str]]:
+    """File names staged in directory, or None if it is not a staging dir."""
+    manifest_path = os.path.join(directory, UPLOAD_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def remove_staging(directory: str) -> bool:
+    """Delete a staging dir once its files are indexed; other folders are left alone."""
+    if staged_files(directory) is None:
+        return False
+    shutil.rmtree(directory, ignore_errors=True)
+    return True
@@ -1,46 +1,328 @@
-from celery import shared_task
+from celery import chord, shared_task
+import logging
 import os
+import shutil
+from datetime import timedelta
+from typing import List
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 from .models import IngestionJob
+from .progress import ProgressReporter
+from .staging import remove_staging, staged_files
 from rag.data_ingestor.ingestion import FolderPDFIngestor
+from rag.services.services import invalidate_collection
 
+logger = logging.getLogger(__name__)
 
-@shared_task(bind=True)
+
+def _make_ingestor(folder_path: str, doc_id: str, checkpoint: dict = None) -> FolderPDFIngestor:
+    chroma_dir = os.path.join("vector_store", doc_id)
+    os.makedirs(chroma_dir, exist_ok=True)
+
+    return FolderPDFIngestor(
+        folder_path=folder_path,
+        # only the files of this upload
+        files=staged_files(folder_path),
+        chroma_dir=chroma_dir,
+        collection_name=doc_id,
+        extract_tables=True,
+        chunking_strategy=settings.RAG_CHUNKING["strategy"],
+        chunk_size=settings.RAG_CHUNKING["chunk_size"],
+        chunk_overlap=settings.RAG_CHUNKING["chunk_overlap"],
+        pages_per_task=settings.RAG_INGEST_FANOUT["pages_per_task"],
+        checkpoint=checkpoint
+    )
+
+
+def _reporter(job_id: int, ingestor: FolderPDFIngestor = None) -> ProgressReporter:
+    reporter = ProgressReporter(job_id)
+    if ingestor is not None:
+        ingestor.on_stage = reporter.stage
+        ingestor.on_checkpoint = reporter.checkpoint
+    return reporter
+
+
+def _fail(job_id: int, error: Exception):
+    # a duplicate run (redelivery, recovery) may fail after another run
+    # completed the job; that must not turn it into failed
+    failed = IngestionJob.objects.filter(id=job_id).exclude(status="completed").update(
+        status="failed",
+        message=str(error),
+        updated_at=timezone.now()
+    )
+    if failed:
+        ProgressReporter(job_id).flush()
+
+
+def _retry_or_fail(job_id: int, folder_path: str, doc_id: str, error: Exception) -> bool:
+    """
+    Queue the job again, to resume from its checkpoint, unless it has used
+    up its attempts; then it fails. Returns whether the error is handled:
+    queued again, or moot because another run already completed the job.
+    """
+    status, attempts = IngestionJob.objects.values_list("status", "attempts").get(id=job_id)
+    if status == "completed":
+        logger.info("job %s: a duplicate run failed after completion: %s", job_id, error)
+        return True
+    if attempts >= settings.RAG_INGEST_RECOVERY["max_attempts"]:
+        _fail(job_id, error)
+        return False
+
+    ProgressReporter(job_id).flush(
+        status="pending",
+        message=f"attempt {attempts} failed ({error}), retrying"
+    )
+    ingest_folder_task.apply_async(
+        kwargs={"folder_path": folder_path, "job_id": job_id, "doc_id": doc_id},
+        countdown=settings.RAG_INGEST_RECOVERY["retry_delay"]
+    )
+    return True
+
+
+def _resumed_counters(ingestor: FolderPDFIngestor, plan: dict) -> dict:
+    """Stage counters restarted from what the checkpoint already holds."""
+    done = ingestor.checkpoint["units"].values()
+    pages_done = sum(counts["pages"] for counts in done)
+    chunks_done = sum(counts["chunks"] + counts["tables"] for counts in done)
+    return {
+        "pages_total": pages_done + sum(unit[4] - unit[3] for unit in plan["units"]),
+        "pages_parsed": pages_done,
+        "chunks_embedded": chunks_done,
+        "chunks_written": chunks_done,
+    }
+
+
+def _finish(reporter: ProgressReporter, ingestor: FolderPDFIngestor, doc_id: str):
+    """Mark the job completed; its staged uploads are indexed and can go."""
+    # the ingestor keeps running counters
+    documents_count = ingestor.stats["documents"]
+    chunks_count = ingestor.stats["chunks_written"]
+    skipped_count = len(ingestor.skipped)
+
+    message = f"ingested {documents_count} documents ({chunks_count} chunks) into collection={doc_id} at {ingestor.chroma_dir}, skipped {skipped_count} already indexed"
+    reporter.flush(status="completed", progress=100, message=message)
+
+    invalidate_collection(doc_id)
+    # failed jobs keep their files, so they can be retried
+    remove_staging(ingestor.folder_path)
+
+    logger.info(
+        "job %s: %s; stage timings %s; embedding %s; embedding cache %s",
+        reporter.job_id,
+        message,
+        ingestor.timings,
+        ingestor.batcher.stats(),
+        ingestor.embedding_cache.stats() if ingestor.embedding_cache is not None else None
+    )
+
+
+# acks_late: a task whose worker dies is redelivered instead of lost; like
+# a retry it resumes from the job's checkpoint
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
 def ingest_folder_task(self, folder_path: str, job_id: int, doc_id: str):
+    # a redelivered or recovered copy of a job that already finished has
+    # nothing to do (its staged upload is gone by now)
+    claimed = IngestionJob.objects.filter(id=job_id).exclude(status="completed").update(
+        status="running",
+        progress=0,
+        attempts=F("attempts") + 1,
+        updated_at=timezone.now()
+    )
+    if not claimed:
+        logger.info("job %s is already completed, skipping", job_id)
+        return
     job = IngestionJob.objects.get(id=job_id)
-    job.status = "running"
-    job.progress = 0
-    job.save()
+    reporter = None
 
     try:
-        chroma_dir = os.path.join("vector_store", doc_id)
-        os.makedirs(chroma_dir, exist_ok=True)
-
-        ingestor = FolderPDFIngestor(
-            folder_path=folder_path,
-            chroma_dir=chroma_dir,
-            collection_name=doc_id,
-            extract_tables=True
-        )
+        ingestor = _make_ingestor(folder_path, doc_id, job.checkpoint)
+        plan = ingestor.plan()
+        reporter = _reporter(job.id, ingestor)
+        reporter.flush(**_resumed_counters(ingestor, plan))
+
+        if settings.RAG_INGEST_FANOUT["enabled"] and len(plan["units"]) > 1:
+            _fan_out(reporter, folder_path, doc_id, plan, job.attempts)
+            return
 
-        current = 0
+        # coalesced by the reporter instead of one save per batch
         for step_progress in ingestor.ingest_with_progress():
-            current = step_progress
-            job.progress = current
-            job.save(update_fields=["progress"])
+            reporter.set_progress(step_progress)
 
-        # ingestion_with_progress populated ingestor.metadatas/documents
-        documents_count = len(set(m["doc_id"] for m in getattr(ingestor, "metadatas", [])))
-        chunks_count = len(getattr(ingestor, "documents", []))
+        _finish(reporter, ingestor, doc_id)
+
+    except Exception as e:
+        if reporter is not None:
+            # keep the checkpoint of what was written before the error
+            reporter.flush()
+        if not _retry_or_fail(job.id, folder_path, doc_id, e):
+            raise
+
+
+def _fan_out(reporter: ProgressReporter, folder_path: str, doc_id: str, plan: dict, attempt: int):
+    """
+    One ingest_pages_task per planned page range, all spooling to their own
+    file, then commit_ingest_task writes them to the collection.
+    """
+    units = plan["units"]
+    job_id = reporter.job_id
+    # per attempt, so tasks left over from a lost attempt cannot write into it
+    spool_dir = os.path.join("vector_store", doc_id, "_spool", f"{job_id}_{attempt}")
+    spool_paths = [os.path.join(spool_dir, f"unit_{i:05d}.sqlite3") for i in range(len(units))]
+
+    # each range moves progress by its share of the pages; the last 5%
+    # are left for the commit
+    total_pages = sum(unit[4] - unit[3] for unit in units) or 1
+    header = [
+        ingest_pages_task.s(
+            folder_path, job_id, doc_id, unit, spool_path,
+            (unit[4] - unit[3]) * 95 // total_pages, attempt
+        )
+        for unit, spool_path in zip(units, spool_paths)
+    ]
 
-        job.status = "completed"
-        job.progress = 100
-        job.message = f"ingested {documents_count} documents ({chunks_count} chunks) into collection={doc_id} at {chroma_dir}"
-        job.save()
+    reporter.flush(message=f"indexing {len(units)} page ranges in parallel")
 
-        print(f"DEBUG: {job.message}")
+    # if a range fails for good the commit never runs; its error callback
+    # then removes the attempt's spools, once every range has finished
+    commit = commit_ingest_task.s(folder_path, job_id, doc_id, plan, spool_paths)
+    chord(header)(commit.on_error(discard_spools_task.s(spool_dir)))
 
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def ingest_pages_task(
+    self,
+    folder_path: str,
+    job_id: int,
+    doc_id: str,
+    unit: list,
+    spool_path: str,
+    progress_share: int,
+    attempt: int
+):
+    """Parse and embed one page range into its spool file."""
+    try:
+        ingestor = _make_ingestor(folder_path, doc_id)
+        reporter = _reporter(job_id, ingestor)
+        # heartbeat: the range may have waited in the queue for a while,
+        # and recover_stale_jobs() goes by updated_at
+        reporter.flush()
+        result = ingestor.spool_unit(unit, spool_path)
     except Exception as e:
-        job.status = "failed"
-        job.message = str(e)
-        job.save()
+        # retried on its own, so the chord still completes
+        if self.request.retries + 1 < settings.RAG_INGEST_RECOVERY["max_attempts"]:
+            raise self.retry(exc=e, countdown=settings.RAG_INGEST_RECOVERY["retry_delay"])
+
+        # only this range's spool: the other ranges may still be writing
+        # theirs (discard_spools_task removes the directory)
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
+        # then the whole job is retried or failed, as in ingest_folder_task;
+        # by the first range of this attempt to give up only
+        claimed = IngestionJob.objects.filter(id=job_id, attempts=attempt, status="running").update(
+            status="pending",
+            updated_at=timezone.now()
+        )
+        if claimed:
+            _retry_or_fail(job_id, folder_path, doc_id, e)
+        # either way the chord must fail, so the commit never runs
         raise
+
+    # several ranges finish at once, so the reporter adds (F()) instead
+    # of read-modify-write
+    reporter.add_progress(progress_share)
+    reporter.flush()
+    return result
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def commit_ingest_task(
+    self,
+    results: list,
+    folder_path: str,
+    job_id: int,
+    doc_id: str,
+    plan: dict,
+    spool_paths: list
+):
+    """Chord callback: the only writer to the collection for a fanned-out job."""
+    reporter = None
+    try:
+        status, checkpoint = IngestionJob.objects.values_list("status", "checkpoint").get(id=job_id)
+        if status == "completed":
+            # a duplicate run of the job got there first
+            return
+
+        ingestor = _make_ingestor(folder_path, doc_id, checkpoint)
+        reporter = _reporter(job_id, ingestor)
+        ingestor.commit_spooled(plan, results, spool_paths)
+        _finish(reporter, ingestor, doc_id)
+
+    except Exception as e:
+        if reporter is not None:
+            reporter.flush()
+        # the spools go either way; a new attempt re-parses only the units
+        # that did not make it into the checkpoint
+        if not _retry_or_fail(job_id, folder_path, doc_id, e):
+            raise
+
+    finally:
+        shutil.rmtree(os.path.dirname(spool_paths[0]), ignore_errors=True)
+
+
+@shared_task
+def discard_spools_task(request, exc, traceback, spool_dir: str):
+    """
+    Error callback of the commit task: the chord failed, so the spools of
+    this attempt will never be committed.
+    """
+    shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+def recover_stale_jobs(stale_after: int = None, include_failed: bool = False) -> List[int]:
+    """
+    Queue again the jobs whose worker went away: running, but without a
+    progress update (heartbeat) for stale_after seconds, and failed ones
+    if asked. They resume from their checkpoint. Pending jobs are left
+    alone: they are waiting in the queue or for a retry, not lost.
+    Returns the ids of the queued jobs.
+    """
+    recovery = settings.RAG_INGEST_RECOVERY
+    if stale_after is None:
+        stale_after = recovery["stale_after"]
+    statuses = ["running"] + (["failed"] if include_failed else [])
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+
+    queued = []
+    for job in IngestionJob.objects.filter(status__in=statuses, updated_at__lt=cutoff):
+        if not job.folder_path or staged_files(job.folder_path) is None:
+            _fail(job.id, RuntimeError("the staged upload is gone, upload the files again"))
+            continue
+        if job.status != "failed" and job.attempts >= recovery["max_attempts"]:
+            _fail(job.id, RuntimeError(f"gave up after {job.attempts} attempts"))
+            continue
+
+        # claimed only if nobody touched it since we read it, so two
+        # recoveries running at once do not queue it twice
+        claimed = IngestionJob.objects.filter(id=job.id, updated_at=job.updated_at).update(
+            status="pending",
+            message="recovered, resuming from checkpoint",
+            updated_at=timezone.now()
+        )
+        if not claimed:
+            continue
+
+        ingest_folder_task.delay(
+            folder_path=job.folder_path,
+            job_id=job.id,
+            doc_id=job.collection_name
+        )
+        queued.append(job.id)
+
+    return queued
+
+
+@shared_task
+def recover_stale_ingestions_task() -> List[int]:
+    return recover_stale_jobs()
@@ -1,3 +1,1110 @@
-from django.test import TestCase
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import fitz
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import Http404
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from rag.ans_builder.beautify_answer import AnswerBeautifier
+from rag.data_ingestor import batching, ingestion
+from rag.data_ingestor.batching import AdaptiveBatcher
+from rag.data_ingestor.chunking import ParentChildChunker, SentenceChunker, chunking_signature, get_chunker
+from rag.data_ingestor.embedding_cache import ChunkEmbeddingCache
+from rag.inference.micro_batching import MicroBatcher
+from rag.retriever.query_cache import QueryEmbeddingCache
+from rag.retriever.retriever import ChromaRetriever
+from rag.retriever.score_cache import RerankScoreCache
+from rag.services.answer_cache import SemanticAnswerCache
+from rag.services.retriever_pool import RetrieverPool
+from rag.services import services
+from rag_django.celery import app as celery_app
+from web import progress, tasks, views
+from web.models import IngestionJob
+from web.staging import staged_files
+
+
+class FakeModels:
+    """Stands in for genai.Client().models: replays fixed text pieces."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.calls = []
+
+    def generate_content_stream(self, model, contents, config):
+        self.calls.append(contents)
+        return iter([SimpleNamespace(text=piece) for piece in self.pieces])
+
+
+class FakeAsyncModels(FakeModels):
+    """genai.Client().aio.models: the stream is awaited, then iterated async."""
+
+    async def generate_content_stream(self, model, contents, config):
+        self.calls.append(contents)
+
+        async def stream():
+            for piece in self.pieces:
+                yield SimpleNamespace(text=piece)
+
+        return stream()
+
+
+class FakeLLMClient:
+    def __init__(self, pieces):
+        self.models = FakeModels(pieces)
+        self.aio = SimpleNamespace(models=FakeAsyncModels(pieces))
+
+
+DOCUMENTS = [
+    {"id": "doc_1_text_0", "content": "Matter is made of particles.",
+     "metadata": {"source": "iesc101.pdf", "page": 1}},
+    {"id": "doc_2_text_0", "content": "Particles attract each other.",
+     "metadata": {"source": "iesc101.pdf", "page": 2}},
+]
+
+
+class StreamAnswerTests(SimpleTestCase):
+    def test_sources_come_before_the_text(self):
+        builder = AnswerBeautifier(llm_client=FakeLLMClient(["Matter ", "", "is particles."]))
+
+        events = list(builder.stream_answer("What is matter?", DOCUMENTS))
+
+        self.assertEqual(events, [
+            {"sources": ["iesc101.pdf - Page 1"]},
+            {"delta": "Matter "},
+            {"delta": "is particles."},
+        ])
+        self.assertIn("Matter is made of particles.", builder.client.models.calls[0])
+
+    def test_ask_rag_stream_frames_and_answer_cache(self):
+        builder = AnswerBeautifier(llm_client=FakeLLMClient(["Matter ", "is particles."]))
+        retriever = mock.Mock()
+        retriever.embed_query.return_value = [1.0, 0.0]
+        cache = mock.Mock()
+        cache.lookup.return_value = None
+
+        with mock.patch.object(services, "_retrieve", return_value=(retriever, DOCUMENTS)), \
+                mock.patch.object(services, "get_answer_cache", return_value=cache):
+            events = list(services.ask_rag_stream("What is matter?", "user_1", builder))
+
+        self.assertEqual(events, [
+            {"sources": ["iesc101.pdf - Page 1"]},
+            {"delta": "Matter "},
+            {"delta": "is particles."},
+            {"done": True},
+        ])
+        cache.store.assert_called_once_with(
+            "user_1",
+            [1.0, 0.0],
+            ["doc_1_text_0", "doc_2_text_0"],
+            {"answer": "Matter is particles.", "sources": ["iesc101.pdf - Page 1"]},
+        )
+
+    def test_ask_rag_stream_replays_a_cached_answer(self):
+        builder = AnswerBeautifier(llm_client=FakeLLMClient(["never used"]))
+        retriever = mock.Mock()
+        retriever.embed_query.return_value = [1.0, 0.0]
+        cache = mock.Mock()
+        cache.lookup.return_value = {"answer": "Cached.", "sources": ["iesc101.pdf - Page 1"]}
+
+        with mock.patch.object(services, "_retrieve", return_value=(retriever, DOCUMENTS)), \
+                mock.patch.object(services, "get_answer_cache", return_value=cache):
+            events = list(services.ask_rag_stream("What is matter?", "user_1", builder))
+
+        self.assertEqual(events, [
+            {"sources": ["iesc101.pdf - Page 1"]},
+            {"delta": "Cached."},
+            {"done": True},
+        ])
+        self.assertEqual(builder.client.models.calls, [])
+
+
+class AsyncStreamAnswerTests(SimpleTestCase):
+    async def test_aask_rag_stream_frames(self):
+        builder = AnswerBeautifier(llm_client=FakeLLMClient(["Matter ", "", "is particles."]))
+        cache = mock.Mock()
+        cache.lookup.return_value = None
+
+        with mock.patch.object(services, "_retrieve_with_embedding", return_value=(DOCUMENTS, [1.0, 0.0])), \
+                mock.patch.object(services, "get_answer_cache", return_value=cache):
+            events = [
+                event async for event in services.aask_rag_stream("What is matter?", "user_1", builder)
+            ]
+
+        self.assertEqual(events, [
+            {"sources": ["iesc101.pdf - Page 1"]},
+            {"delta": "Matter "},
+            {"delta": "is particles."},
+            {"done": True},
+        ])
+        self.assertEqual(builder.client.models.calls, [])
+        self.assertEqual(len(builder.client.aio.models.calls), 1)
+
+    async def test_ask_stream_view_streams_asynchronously(self):
+        async def fake_stream(question, doc_id):
+            yield {"sources": ["iesc101.pdf - Page 1"]}
+            yield {"delta": "Matter is particles."}
+            yield {"done": True}
+
+        request = AsyncRequestFactory().post("/ask/stream/", {"question": "What is matter?"})
+        user = User(username="reader")
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        request.user = user
+
+        with mock.patch.object(views, "aask_rag_stream", fake_stream), \
+                mock.patch.object(views, "get_or_create_user_index",
+                                  return_value=SimpleNamespace(collection_name="user_1")):
+            response = await views.ask_stream(request)
+            # an async iterator is what lets ASGI flush frame by frame
+            self.assertTrue(response.is_async)
+            frames = [frame async for frame in response]
+
+        self.assertEqual(frames, [
+            b'data: {"sources": ["iesc101.pdf - Page 1"]}\n\n',
+            b'data: {"delta": "Matter is particles."}\n\n',
+            b'data: {"done": true}\n\n',
+        ])
+
+
+class FakeEmbeddingModel:
+    """Deterministic 8-d vectors instead of a SentenceTransformer."""
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), 8), dtype=np.float32)
+        for i, text in enumerate(texts):
+            vectors[i, hash(text) % 8] = 1.0
+        return vectors
+
+
+class FakeCollection:
+    """The part of a Chroma collection the ingestor uses, in memory."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = {}
+        # writes per chunk id, to see what a resumed run redid
+        self.upserts = Counter()
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        for row in zip(ids, documents, metadatas, embeddings):
+            self.rows[row[0]] = row
+            self.upserts[row[0]] += 1
+
+    def _matches(self, metadata, where):
+        return all(metadata.get(key) == value for key, value in (where or {}).items())
+
+    def get(self, where=None, limit=None, offset=0, include=None):
+        rows = [row for row in self.rows.values() if self._matches(row[2], where)]
+        rows = rows[offset:offset + limit if limit is not None else None]
+        return {
+            "ids": [row[0] for row in rows],
+            "documents": [row[1] for row in rows],
+            "metadatas": [row[2] for row in rows],
+            "embeddings": [row[3] for row in rows],
+        }
+
+    def update(self, ids, metadatas):
+        # like Chroma: keys are merged, None removes one
+        for chunk_id, changes in zip(ids, metadatas):
+            row = self.rows[chunk_id]
+            metadata = {**row[2], **changes}
+            metadata = {key: value for key, value in metadata.items() if value is not None}
+            self.rows[chunk_id] = (row[0], row[1], metadata, row[3])
+
+    def query(self, query_embeddings, n_results, include=None):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_embedding in query_embeddings:
+            ranked = sorted(
+                ((1.0 - float(np.dot(query_embedding, row[3])), row) for row in self.rows.values()),
+                key=lambda ranked_row: ranked_row[0]
+            )[:n_results]
+            results["ids"].append([row[0] for _, row in ranked])
+            results["documents"].append([row[1] for _, row in ranked])
+            results["metadatas"].append([row[2] for _, row in ranked])
+            results["distances"].append([distance for distance, _ in ranked])
+        return results
+
+    def delete(self, ids=None, where=None):
+        for chunk_id, row in list(self.rows.items()):
+            if (ids is not None and chunk_id in ids) or (where is not None and self._matches(row[2], where)):
+                del self.rows[chunk_id]
+
+
+class FakeChromaClient:
+    """Stands in for chromadb.PersistentClient; every client sees one store."""
+
+    collections = {}
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_or_create_collection(self, name, metadata=None):
+        return self.collections.setdefault((self.path, name), FakeCollection(name))
+
+
+def make_pdf(*pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class IngestionTestCase(TestCase):
+    """
+    Runs ingestion for real (parsing, chunking, checkpoints, manifest)
+    with eager Celery, an in-process progress channel, a fake embedding
+    model and an in-memory Chroma, inside a scratch working directory
+    (the vector store paths are relative).
+    """
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        cwd = os.getcwd()
+        os.chdir(self.workdir)
+        self.addCleanup(os.chdir, cwd)
+
+        FakeChromaClient.collections = {}
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.workdir, "media"),
+            RAG_PROGRESS={"channel": "inprocess", "redis_url": "", "interval": 0.0},
+            RAG_INGEST_FANOUT={"enabled": False, "pages_per_task": 40},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # .delay() runs the task inline, as CELERY_TASK_ALWAYS_EAGER=1 does
+        # (the app reads Django settings under the CELERY_ namespace)
+        eager = {"CELERY_TASK_ALWAYS_EAGER": True, "CELERY_TASK_EAGER_PROPAGATES": True}
+        previous = {
+            "CELERY_TASK_ALWAYS_EAGER": celery_app.conf.task_always_eager,
+            "CELERY_TASK_EAGER_PROPAGATES": celery_app.conf.task_eager_propagates,
+        }
+        celery_app.conf.update(eager)
+        self.addCleanup(celery_app.conf.update, previous)
+
+        patches = [
+            mock.patch.object(progress, "_channel", None),
+            mock.patch.object(ingestion, "get_embedding_model", return_value=FakeEmbeddingModel()),
+            mock.patch.object(ingestion, "PersistentClient", FakeChromaClient),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.user = User.objects.create_user(username="reader", password="secret")
+        self.client.force_login(self.user)
+
+    def text_collection(self):
+        return next(
+            collection
+            for (_, name), collection in FakeChromaClient.collections.items()
+            if name == "user_reader_rag"
+        )
+
+    def text_chunks(self):
+        return list(self.text_collection().rows.values())
+
+
+class EagerIngestionTests(IngestionTestCase):
+    def test_upload_is_indexed_inline_and_the_job_completes(self):
+        upload = SimpleUploadedFile(
+            "matter.pdf",
+            make_pdf("Matter is made of particles.", "Particles attract each other."),
+            content_type="application/pdf",
+        )
+
+        response = self.client.post("/dashboard/", {"files": [upload]})
+
+        self.assertEqual(response.status_code, 200)
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, "completed", job.message)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.pages_parsed, 2)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(
+            sorted(row[1] for row in self.text_chunks()),
+            ["Matter is made of particles.", "Particles attract each other."],
+        )
+        # indexed uploads are not kept
+        self.assertFalse(os.path.exists(job.folder_path))
+
+
+class StagedUploadTests(IngestionTestCase):
+    def test_the_view_only_stages_and_queues_and_indexing_removes_the_stage(self):
+        upload = SimpleUploadedFile("matter.pdf", make_pdf("Matter is made of particles."), content_type="application/pdf")
+
+        with mock.patch.object(views.ingest_folder_task, "delay") as delay:
+            response = self.client.post("/dashboard/", {"files": [upload]})
+
+        self.assertEqual(response.status_code, 200)
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, "pending")
+        self.assertEqual(job.folder_path, os.path.join(self.workdir, "media", "uploads", "reader", str(job.id)))
+        delay.assert_called_once_with(folder_path=job.folder_path, job_id=job.id, doc_id="user_reader_rag")
+        # nothing was parsed or written in the request
+        self.assertEqual(FakeChromaClient.collections, {})
+        self.assertEqual(staged_files(job.folder_path), ["matter.pdf"])
+        self.assertTrue(os.path.exists(os.path.join(job.folder_path, "matter.pdf")))
+
+        # what the worker then runs
+        tasks.ingest_folder_task.apply(kwargs=delay.call_args.kwargs)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "completed", job.message)
+        self.assertEqual([row[1] for row in self.text_chunks()], ["Matter is made of particles."])
+        self.assertFalse(os.path.exists(job.folder_path))
+
+
+class ProgressReporterTests(TestCase):
+    def setUp(self):
+        self.job = IngestionJob.objects.create(status="running")
+        self.channel = progress.InProcessProgressChannel()
+        self.subscription = self.channel.subscribe(self.job.id)
+        self.addCleanup(self.subscription.close)
+        self.clock = [1000.0]
+        patch = mock.patch.object(progress.time, "monotonic", lambda: self.clock[0])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_stage_deltas_are_coalesced_into_one_update_per_interval(self):
+        reporter = progress.ProgressReporter(self.job.id, channel=self.channel, interval=1.0)
+
+        # the first report flushes: one UPDATE, one SELECT for the snapshot
+        with self.assertNumQueries(2):
+            reporter.stage("pages_parsed", 1)
+        first = self.subscription.get(timeout=0)
+        self.assertEqual(first["stages"]["pages_parsed"], 1)
+
+        # within the interval nothing touches the database or the channel
+        with self.assertNumQueries(0):
+            reporter.stage("pages_parsed", 2)
+            reporter.stage("chunks_embedded", 64)
+            reporter.stage("chunks_written", 32)
+            reporter.stage("chunks_embedded", 16)
+        self.assertIsNone(self.subscription.get(timeout=0))
+
+        self.clock[0] += 1.0
+        with self.assertNumQueries(2):
+            reporter.stage("chunks_written", 48)
+
+        snapshot = self.subscription.get(timeout=0)
+        self.assertEqual(snapshot["stages"], {
+            "pages_total": 0,
+            "pages_parsed": 3,
+            "chunks_embedded": 80,
+            "chunks_written": 80,
+        })
+        self.assertIsNone(self.subscription.get(timeout=0))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.chunks_written, 80)
+
+    def test_only_the_owner_thread_flushes(self):
+        reporter = progress.ProgressReporter(self.job.id, channel=self.channel, interval=0.0)
+
+        worker = threading.Thread(target=reporter.stage, args=("chunks_written", 10))
+        worker.start()
+        worker.join()
+        self.assertIsNone(self.subscription.get(timeout=0))
+
+        snapshot = reporter.flush(status="completed")
+        self.assertEqual(snapshot["status"], "completed")
+        self.assertEqual(snapshot["stages"]["chunks_written"], 10)
+        self.assertEqual(self.subscription.get(timeout=0), snapshot)
+
+
+class IngestionEventsTests(TestCase):
+    async def test_events_stream_asynchronously_until_the_job_finishes(self):
+        job = await IngestionJob.objects.acreate(status="running")
+        channel = progress.InProcessProgressChannel()
+        request = RequestFactory().get(f"/dashboard/status/{job.id}/events/")
+
+        with mock.patch.object(views, "get_progress_channel", return_value=channel):
+            response = await views.ingestion_events(request, job.id)
+            self.assertTrue(response.is_async)
+
+            frames = response.__aiter__()
+            self.assertIn(b'"status": "running"', await anext(frames))
+
+            channel.publish(job.id, {"job_id": job.id, "status": "completed", "progress": 100})
+            self.assertIn(b'"status": "completed"', await anext(frames))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(frames)
+
+
+    async def test_an_unknown_job_is_a_404_without_a_subscription(self):
+        channel = progress.InProcessProgressChannel()
+        request = RequestFactory().get("/dashboard/status/404/events/")
+
+        with mock.patch.object(views, "get_progress_channel", return_value=channel):
+            with self.assertRaises(Http404):
+                await views.ingestion_events(request, 404)
+
+        self.assertEqual(channel._subscribers, {})
+
+    async def test_the_subscription_is_closed_if_the_job_read_fails(self):
+        job = await IngestionJob.objects.acreate(status="running")
+        channel = progress.InProcessProgressChannel()
+        request = RequestFactory().get(f"/dashboard/status/{job.id}/events/")
+
+        with mock.patch.object(views, "get_progress_channel", return_value=channel), \
+                mock.patch.object(IngestionJob.objects, "aget", side_effect=IngestionJob.DoesNotExist):
+            with self.assertRaises(IngestionJob.DoesNotExist):
+                await views.ingestion_events(request, job.id)
+
+        self.assertEqual(channel._subscribers, {})
+
+
+class ResumableIngestionTests(IngestionTestCase):
+    def upload(self, *pages):
+        upload = SimpleUploadedFile("matter.pdf", make_pdf(*pages), content_type="application/pdf")
+        return self.client.post("/dashboard/", {"files": [upload]})
+
+    @override_settings(
+        RAG_INGEST_FANOUT={"enabled": False, "pages_per_task": 1},
+        RAG_INGEST_RECOVERY={"max_attempts": 2, "retry_delay": 0, "stale_after": 900},
+    )
+    def test_a_retried_job_resumes_from_its_checkpoint(self):
+        original_upsert = FakeCollection.upsert
+        failures = []
+
+        def upsert_failing_once_on_page_three(collection, ids, documents, metadatas, embeddings):
+            if "Page three." in documents and not failures:
+                failures.append(ids)
+                raise RuntimeError("worker lost")
+            return original_upsert(collection, ids, documents, metadatas, embeddings)
+
+        # one chunk per window, so pages are written (and checkpointed) one by one
+        with mock.patch.object(ingestion, "WINDOW_SIZE", 1), \
+                mock.patch.object(FakeCollection, "upsert", upsert_failing_once_on_page_three):
+            self.upload("Page one.", "Page two.", "Page three.")
+
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, "completed", job.message)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(len(job.checkpoint["units"]), 3)
+
+        writes = {
+            self.text_collection().rows[chunk_id][1]: count
+            for chunk_id, count in self.text_collection().upserts.items()
+        }
+        # page one was checkpointed before the failure and is not redone;
+        # page two was written but not yet checkpointed, so it is upserted
+        # again (same id, no duplicate)
+        self.assertEqual(writes, {"Page one.": 1, "Page two.": 2, "Page three.": 1})
+        self.assertEqual(len(self.text_chunks()), 3)
+
+    def test_a_completed_job_is_not_run_again(self):
+        self.upload("Page one.")
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, "completed")
+
+        # e.g. redelivered after the worker died between finishing and acking
+        tasks.ingest_folder_task.delay(
+            folder_path=job.folder_path, job_id=job.id, doc_id=job.collection_name
+        )
+        tasks._fail(job.id, FileNotFoundError(job.folder_path))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.attempts, 1)
+
+
+class RecoverStaleJobsTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        with open(os.path.join(self.folder, "upload.json"), "w") as f:
+            f.write('{"files": ["matter.pdf"]}')
+
+    def make_job(self, status, age):
+        job = IngestionJob.objects.create(
+            status=status, folder_path=self.folder, collection_name="user_reader_rag"
+        )
+        # updated_at is auto_now, so set it with update()
+        IngestionJob.objects.filter(id=job.id).update(
+            updated_at=timezone.now() - timedelta(seconds=age)
+        )
+        return job
+
+    @override_settings(RAG_PROGRESS={"channel": "inprocess", "redis_url": "", "interval": 0.0})
+    def test_only_running_jobs_without_a_heartbeat_are_queued_again(self):
+        stale = self.make_job("running", 3600)
+        self.make_job("running", 10)
+        # waiting in the Celery queue, however long, is not lost
+        self.make_job("pending", 3600)
+        self.make_job("completed", 3600)
+
+        with mock.patch.object(progress, "_channel", None), \
+                mock.patch.object(tasks.ingest_folder_task, "delay") as delay:
+            queued = tasks.recover_stale_jobs(stale_after=900)
+
+        self.assertEqual(queued, [stale.id])
+        delay.assert_called_once_with(
+            folder_path=self.folder, job_id=stale.id, doc_id="user_reader_rag"
+        )
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, "pending")
+
+
+class FanOutFailureTests(TestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+        ingestor = mock.Mock()
+        ingestor.spool_unit.side_effect = RuntimeError("parse error")
+        patches = [
+            mock.patch.object(progress, "_channel", None),
+            mock.patch.object(tasks, "_make_ingestor", return_value=ingestor),
+            mock.patch.object(tasks.ingest_folder_task, "apply_async"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def fail_range(self, job, index):
+        spool_path = os.path.join(self.spool_dir, f"unit_{index:05d}.sqlite3")
+        open(spool_path, "w").close()
+        # its own retries used up
+        result = tasks.ingest_pages_task.apply(
+            args=["media/uploads/reader/1", job.id, "user_reader_rag", [], spool_path, 50, job.attempts],
+            retries=2,
+            throw=False
+        )
+        self.assertTrue(result.failed())
+        self.assertFalse(os.path.exists(spool_path))
+
+    @override_settings(
+        RAG_PROGRESS={"channel": "inprocess", "redis_url": "", "interval": 0.0},
+        RAG_INGEST_RECOVERY={"max_attempts": 3, "retry_delay": 0, "stale_after": 900},
+    )
+    def test_a_failed_range_retries_the_whole_job_once(self):
+        job = IngestionJob.objects.create(status="running", attempts=1)
+
+        self.fail_range(job, 0)
+        self.fail_range(job, 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "pending")
+        tasks.ingest_folder_task.apply_async.assert_called_once_with(
+            kwargs={"folder_path": "media/uploads/reader/1", "job_id": job.id, "doc_id": "user_reader_rag"},
+            countdown=0
+        )
+
+    @override_settings(
+        RAG_PROGRESS={"channel": "inprocess", "redis_url": "", "interval": 0.0},
+        RAG_INGEST_RECOVERY={"max_attempts": 3, "retry_delay": 0, "stale_after": 900},
+    )
+    def test_the_job_fails_once_its_attempts_are_used_up(self):
+        job = IngestionJob.objects.create(status="running", attempts=3)
+
+        self.fail_range(job, 0)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), ("failed", "parse error"))
+        tasks.ingest_folder_task.apply_async.assert_not_called()
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+    def test_normalized_queries_share_an_entry_and_the_oldest_is_evicted(self):
+        cache = QueryEmbeddingCache(max_size=2)
+        cache.put("What is  an Atom?", [1.0, 0.0])
+        cache.put("what is a molecule?", [0.0, 1.0])
+
+        self.assertEqual(cache.get("  what is an atom?"), [1.0, 0.0])
+        # the atom was just used, so the molecule goes
+        cache.put("what is an ion?", [0.5, 0.5])
+        self.assertIsNone(cache.get("what is a molecule?"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_entries_survive_a_restart_with_a_db_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        db_path = os.path.join(directory, "queries.sqlite3")
+
+        QueryEmbeddingCache(db_path=db_path, model_name="mini").put("atom", [0.25, 0.75])
+
+        self.assertEqual(QueryEmbeddingCache(db_path=db_path, model_name="mini").get("atom"), [0.25, 0.75])
+        # another model's vectors are not reused
+        self.assertIsNone(QueryEmbeddingCache(db_path=db_path, model_name="other").get("atom"))
+
+    def test_the_file_is_bounded_by_last_use(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        db_path = os.path.join(directory, "queries.sqlite3")
+        # written before the bound, without last_used
+        db = sqlite3.connect(db_path)
+        db.execute("CREATE TABLE query_embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)")
+        db.close()
+
+        cache = QueryEmbeddingCache(max_size=1, db_path=db_path, max_entries=10)
+        for i in range(10):
+            with mock.patch("rag.retriever.query_cache.time.time", return_value=float(i)):
+                cache.put(f"query {i}", [float(i)])
+        with mock.patch("rag.retriever.query_cache.time.time", return_value=10.0):
+            # only in the file by now
+            self.assertEqual(cache.get("query 0"), [0.0])
+            cache.put("query 10", [10.0])
+
+        # one over: the least recently used tenth plus one go
+        reopened = QueryEmbeddingCache(db_path=db_path)
+        self.assertEqual(
+            [reopened.get(f"query {i}") for i in range(4)],
+            [[0.0], None, None, [3.0]]
+        )
+
+
+class RerankScoreCacheTests(SimpleTestCase):
+    def test_scores_are_per_collection_and_query(self):
+        cache = RerankScoreCache()
+        cache.put_many("physics", "What is an Atom?", ["c1", "c2"], [0.9, 0.1])
+
+        self.assertEqual(cache.get_many("physics", "what is  an atom?", ["c2", "c1", "c3"]), [0.1, 0.9, None])
+        self.assertEqual(cache.get_many("chemistry", "what is an atom?", ["c1"]), [None])
+        self.assertEqual(cache.get_many("physics", "what is an ion?", ["c1"]), [None])
+
+    def test_invalidate_drops_only_that_collection(self):
+        cache = RerankScoreCache(max_size=3)
+        cache.put_many("physics", "atom", ["c1", "c2"], [0.9, 0.1])
+        cache.put_many("chemistry", "atom", ["c1", "c2"], [0.8, 0.2])
+
+        # over max_size: the oldest physics score is evicted
+        self.assertEqual(cache.stats()["size"], 3)
+        self.assertEqual(cache.invalidate("physics"), 1)
+        self.assertEqual(cache.get_many("physics", "atom", ["c2"]), [None])
+        self.assertEqual(cache.get_many("chemistry", "atom", ["c1", "c2"]), [0.8, 0.2])
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    ANSWER = {"answer": "Atoms are tiny.", "sources": ["a.pdf p1"]}
+
+    def test_a_close_question_over_the_same_chunks_is_a_hit(self):
+        cache = SemanticAnswerCache(threshold=0.9)
+        cache.store("physics", [1.0, 0.0], ["c1", "c2"], self.ANSWER)
+
+        self.assertEqual(cache.lookup("physics", [0.95, 0.31], ["c1", "c2"]), self.ANSWER)
+        # too far apart, other chunks, other collection
+        self.assertIsNone(cache.lookup("physics", [0.6, 0.8], ["c1", "c2"]))
+        self.assertIsNone(cache.lookup("physics", [1.0, 0.0], ["c1", "c3"]))
+        self.assertIsNone(cache.lookup("chemistry", [1.0, 0.0], ["c1", "c2"]))
+
+    def test_entries_expire_and_are_invalidated(self):
+        cache = SemanticAnswerCache(ttl_seconds=60)
+        with mock.patch("rag.services.answer_cache.time.monotonic", return_value=1000.0):
+            cache.store("physics", [1.0, 0.0], ["c1"], self.ANSWER)
+            cache.store("chemistry", [1.0, 0.0], ["c1"], self.ANSWER)
+
+        with mock.patch("rag.services.answer_cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.lookup("physics", [1.0, 0.0], ["c1"]))
+
+        self.assertEqual(cache.invalidate("chemistry"), 1)
+        self.assertIsNone(cache.lookup("chemistry", [1.0, 0.0], ["c1"]))
+
+
+class ChunkEmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.db_path = os.path.join(directory, "embeddings.sqlite3")
+
+    def test_vectors_are_shared_by_text_and_model(self):
+        ChunkEmbeddingCache(self.db_path, model_name="mini").put_many(["Atoms.", "Ions."], [[0.5, 0.25], [1.0, 0.0]])
+
+        # another ingestor, e.g. for another user's collection
+        cache = ChunkEmbeddingCache(self.db_path, model_name="mini")
+        self.assertEqual(cache.get_many(["Ions.", "Cells.", "Atoms."]), [[1.0, 0.0], None, [0.5, 0.25]])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertEqual(ChunkEmbeddingCache(self.db_path, model_name="other").get_many(["Atoms."]), [None])
+
+    def test_the_least_recently_used_entries_are_evicted(self):
+        cache = ChunkEmbeddingCache(self.db_path, max_entries=10)
+        for i in range(10):
+            with mock.patch("rag.data_ingestor.embedding_cache.time.time", return_value=float(i)):
+                cache.put_many([f"chunk {i}"], [[float(i)]])
+        with mock.patch("rag.data_ingestor.embedding_cache.time.time", return_value=10.0):
+            cache.get_many(["chunk 0"])
+            cache.put_many(["chunk 10"], [[10.0]])
+
+        # one over: the oldest tenth plus one go, chunk 0 was just used
+        self.assertEqual(cache.stats()["size"], 9)
+        self.assertEqual(cache.get_many(["chunk 0", "chunk 1", "chunk 2", "chunk 3"]), [[0.0], None, None, [3.0]])
+
+
+class ChunkingTests(SimpleTestCase):
+    TEXT = "Atoms are small. Molecules are made of atoms. Ions carry a charge.\n\nCells are alive."
+
+    def test_sentence_chunks_keep_whole_sentences_with_overlap(self):
+        chunks = [chunk for chunk, _ in SentenceChunker(chunk_size=50, chunk_overlap=20).split(self.TEXT)]
+
+        self.assertEqual(chunks, [
+            "Atoms are small. Molecules are made of atoms.",
+            "Ions carry a charge. Cells are alive.",
+        ])
+        chunks = [chunk for chunk, _ in SentenceChunker(chunk_size=50, chunk_overlap=30).split(self.TEXT)]
+        # the previous chunk's last sentence is carried over
+        self.assertTrue(chunks[1].startswith("Molecules are made of atoms. "))
+
+    def test_parent_child_chunks_are_flagged(self):
+        chunks = ParentChildChunker(chunk_size=200, chunk_overlap=50).split(self.TEXT)
+
+        self.assertTrue(chunks)
+        self.assertTrue(all(meta == {"parent_child": True} for _, meta in chunks))
+
+    def test_strategies_by_name_and_signature(self):
+        self.assertEqual(chunking_signature(get_chunker("character", 500, 200)), "character:500:200")
+        # capped to what MiniLM embeds; the tokenizer is not loaded until split()
+        chunker = pickle.loads(pickle.dumps(get_chunker("token", 1000, 300)))
+        self.assertEqual(chunking_signature(chunker), "token:256:128")
+        with self.assertRaises(ValueError):
+            get_chunker("paragraph", 500, 200)
+
+
+class AdaptiveBatcherTests(SimpleTestCase):
+    def run_windows(self, batcher, seconds_per_token, windows=20):
+        """
+        Embed windows of mixed-length chunks on a fake clock where a batch
+        costs its tokens times the per-token time of its size.
+        """
+        clock = [0.0]
+        lengths = [20 + (i * 37) % 480 for i in range(600)]
+        texts = ["x" * length for length in lengths]
+
+        def encode(batch_texts):
+            tokens = sum(batching.estimate_tokens(text) for text in batch_texts)
+            clock[0] += tokens * seconds_per_token(len(batch_texts))
+            return [[0.0]] * len(batch_texts)
+
+        sizes = []
+        with mock.patch("rag.data_ingestor.batching.time.perf_counter", side_effect=lambda: clock[0]):
+            for _ in range(windows):
+                batcher.embed(texts, encode)
+                sizes.append(batcher.batch_size)
+        return sizes
+
+    def test_the_batch_size_converges_on_the_fastest(self):
+        # fastest at 128, a bit slower either side
+        batcher = AdaptiveBatcher()
+        sizes = self.run_windows(batcher, lambda size: 1e-4 * (1 + abs(size - 128) / 256))
+
+        # 64 -> 128 is faster, 256 slower: back to 128 for good
+        self.assertEqual(sizes[:2], [128, 256])
+        self.assertTrue(batcher.settled)
+        self.assertTrue(all(size == 128 for size in sizes[2:]))
+
+    def test_a_slower_first_step_probes_smaller_sizes(self):
+        batcher = AdaptiveBatcher()
+        sizes = self.run_windows(batcher, lambda size: 1e-4 * (1 + abs(size - 32) / 32))
+
+        # 64 -> 128 is slower, so halve: 32 is faster, 16 slower
+        self.assertEqual(sizes[:4], [128, 32, 16, 32])
+        self.assertTrue(batcher.settled)
+        self.assertTrue(all(size == 32 for size in sizes[3:]))
+
+
+class KeywordEmbeddingModel:
+    """Bag-of-words over a few keywords, so similarities are predictable."""
+
+    KEYWORDS = ("atom", "molecule", "ion", "cell", "charge", "mass", "energy", "table")
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        vectors = np.full((len(texts), len(self.KEYWORDS)), 0.01, dtype=np.float32)
+        for i, text in enumerate(texts):
+            for j, keyword in enumerate(self.KEYWORDS):
+                vectors[i, j] += text.lower().count(keyword)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class KeywordCrossEncoder:
+    """Scores a pair by how often the query's words occur in the chunk."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs):
+        self.calls.append(list(pairs))
+        return np.array([
+            sum(content.lower().count(word) for word in query.lower().split()) + len(content) / 1000
+            for query, content in pairs
+        ])
+
+
+class RetrieverTestCase(SimpleTestCase):
+    """ChromaRetriever over FakeChromaClient, with keyword models."""
+
+    def setUp(self):
+        self.chroma_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.chroma_dir, ignore_errors=True)
+        patcher = mock.patch("rag.retriever.retriever.PersistentClient", FakeChromaClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.embedding_model = KeywordEmbeddingModel()
+        self.cross_encoder = KeywordCrossEncoder()
+
+    def collection(self, name="physics"):
+        return FakeChromaClient(self.chroma_dir).get_or_create_collection(name)
+
+    def add_chunks(self, *chunks, name="physics"):
+        """(chunk id, text, content type) rows, embedded like the ingestor does."""
+        embeddings = self.embedding_model.encode([text for _, text, _ in chunks]).tolist()
+        self.collection(name).upsert(
+            ids=[chunk_id for chunk_id, _, _ in chunks],
+            documents=[text for _, text, _ in chunks],
+            metadatas=[{"type": content_type, "source": "physics.pdf", "page": 1} for _, _, content_type in chunks],
+            embeddings=embeddings
+        )
+        self.embedding_model.calls.clear()
+
+    def open_retriever(self, name="physics", **kwargs):
+        return ChromaRetriever(
+            chroma_dir=self.chroma_dir,
+            collection_name=name,
+            embedding_model=self.embedding_model,
+            cross_encoder=self.cross_encoder,
+            query_cache=QueryEmbeddingCache(),
+            score_cache=RerankScoreCache(),
+            **kwargs
+        )
+
+
+class LegacyStoreTests(RetrieverTestCase):
+    def test_a_store_from_before_the_split_is_migrated_when_opened(self):
+        self.add_chunks(
+            ("t1", "An atom has a nucleus.", "text"),
+            ("tab1", "atom mass table", "table"),
+        )
+
+        retriever = self.open_retriever()
+
+        self.assertEqual(list(self.collection().rows), ["t1"])
+        self.assertEqual(list(self.collection("physics_tables").rows), ["tab1"])
+        self.assertEqual([hit["id"] for hit in retriever.retrieve("atom mass", content_type="text")], ["t1"])
+
+    def test_migrate_collections_splits_every_store(self):
+        chroma_dir = os.path.join(self.chroma_dir, "physics")
+        os.makedirs(chroma_dir)
+        text = FakeChromaClient(chroma_dir).get_or_create_collection("physics")
+        text.upsert(
+            ids=["t1", "tab1"],
+            documents=["An atom.", "atom table"],
+            metadatas=[{"type": "text"}, {"type": "table"}],
+            embeddings=[[1.0], [1.0]]
+        )
+        open(os.path.join(chroma_dir, "chroma.sqlite3"), "w").close()
+
+        out = StringIO()
+        with mock.patch("web.management.commands.migrate_collections.PersistentClient", FakeChromaClient):
+            call_command("migrate_collections", root=self.chroma_dir, stdout=out)
+
+        self.assertEqual(list(text.rows), ["t1"])
+        self.assertIn("physics: moved 1 table chunks", out.getvalue())
+
+
+class TableMarkdownMigrationTests(RetrieverTestCase):
+    def test_inline_markdown_moves_to_the_table_store_and_loads_lazily(self):
+        self.add_chunks(
+            ("t1", "An atom has a nucleus.", "text"),
+            ("tab1", "atom mass table", "table"),
+            ("tab2", "cell energy table", "table"),
+        )
+        # written before the side store: markdown inline, tables in the
+        # text collection
+        for chunk_id, row in self.collection().rows.items():
+            if row[2]["type"] == "table":
+                row[2].update(doc_id="doc1", table_markdown=f"| {chunk_id} |")
+
+        retriever = self.open_retriever()
+
+        metadata = self.collection("physics_tables").rows["tab1"][2]
+        self.assertNotIn("table_markdown", metadata)
+        self.assertEqual(metadata["table_ref"], "tab1")
+
+        with mock.patch.object(retriever.table_store, "get_many", wraps=retriever.table_store.get_many) as get_many:
+            tables = retriever.get_tables("atom mass", top_k=1)
+
+        self.assertEqual([(table["id"], table["markdown"]) for table in tables], [("tab1", "| tab1 |")])
+        # only the table that survived reranking is read
+        get_many.assert_called_once_with(["tab1"])
+
+
+class RetrieverPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.versions = {"physics": 1, "chemistry": 1}
+        self.score_cache = RerankScoreCache()
+        for target, replacement in (
+            ("collection_version", lambda chroma_dir, name: self.versions[name]),
+            ("get_score_cache", lambda: self.score_cache),
+            ("ChromaRetriever", lambda **kwargs: SimpleNamespace(**kwargs)),
+        ):
+            patcher = mock.patch(f"rag.services.retriever_pool.{target}", replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(RetrieverPool, "_load_models")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_a_collection_changed_while_evicted_drops_its_caches_on_reopen(self):
+        pool = RetrieverPool(max_size=1)
+        stale = []
+        pool.on_stale.append(stale.append)
+
+        physics = pool.get("vector_store/physics", "physics")
+        self.score_cache.put_many("physics", "atom", ["physics_1_text_0"], [0.9])
+        # evicts physics
+        pool.get("vector_store/chemistry", "chemistry")
+        # reopened, but unchanged: its caches stay
+        self.assertIsNot(pool.get("vector_store/physics", "physics"), physics)
+        self.assertEqual(stale, [])
+        self.assertEqual(self.score_cache.get_many("physics", "atom", ["physics_1_text_0"]), [0.9])
+
+        # rechunked by a Celery worker while physics was out of the pool
+        pool.get("vector_store/chemistry", "chemistry")
+        self.versions["physics"] = 2
+        pool.get("vector_store/physics", "physics")
+
+        self.assertEqual(stale, ["physics"])
+        self.assertEqual(self.score_cache.get_many("physics", "atom", ["physics_1_text_0"]), [None])
+
+
+class RerankCascadeTests(RetrieverTestCase):
+    def setUp(self):
+        super().setUp()
+        # eight atom chunks with the same vector: no gap, so they are
+        # staged; the two best come first, so staging stops early
+        self.add_chunks(
+            ("a0", "atom with a dense nucleus", "text"),
+            ("a1", "atom with electrons around", "text"),
+            *((f"a{i}", f"atom {i}", "text") for i in range(2, 8)),
+            # two clear cell hits: skipped
+            ("c0", "cell membrane", "text"),
+            ("c1", "cell wall", "text"),
+        )
+        self.cascade = {"cascade": True, "skip_margin": 0.5, "candidate_window": 0.25, "cascade_step": 2}
+
+    def test_retrieve_many_stops_early_like_retrieve(self):
+        single = self.open_retriever(**self.cascade)
+        expected = [single.retrieve(query, top_k=2, fetch_k=8) for query in ("atom", "cell")]
+
+        batched = self.open_retriever(**self.cascade)
+        results = batched.retrieve_many(["atom", "cell"], top_k=2, fetch_k=8)
+
+        self.assertEqual(
+            [[hit["id"] for hit in hits] for hits in results],
+            [[hit["id"] for hit in hits] for hits in expected]
+        )
+        self.assertEqual([[hit["id"] for hit in hits] for hits in results], [["a1", "a0"], ["c0", "c1"]])
+        # atom: 4 of 8 pairs scored over two stages; cell: skipped
+        stats = dict(batched.cascade_stats)
+        self.assertEqual(stats.pop("rerank_calls"), 2)
+        self.assertEqual(stats, {"queries": 2, "reranks_skipped": 1, "pairs_scored": 4, "pairs_saved": 12})
+        self.assertEqual(stats, {key: value for key, value in single.cascade_stats.items() if key != "rerank_calls"})
+
+
+class RetrieveManyTests(RetrieverTestCase):
+    def test_one_embed_call_and_the_same_results_as_retrieve(self):
+        self.add_chunks(
+            ("a0", "An atom has a nucleus.", "text"),
+            ("a1", "Atom mass is mostly in the nucleus.", "text"),
+            ("c0", "A cell has a membrane.", "text"),
+            ("e0", "Energy of an ion.", "text"),
+        )
+        expected = [self.open_retriever().retrieve(query, top_k=2) for query in ("atom mass", "cell")]
+        self.embedding_model.calls.clear()
+        self.cross_encoder.calls.clear()
+
+        results = self.open_retriever().retrieve_many(["atom mass", "cell"], top_k=2)
+
+        self.assertEqual(
+            [[(hit["id"], hit["cross_score"]) for hit in hits] for hits in results],
+            [[(hit["id"], hit["cross_score"]) for hit in hits] for hits in expected]
+        )
+        self.assertEqual([hits[0]["id"] for hits in results], ["a1", "c0"])
+        self.assertEqual(self.embedding_model.calls, [["atom mass", "cell"]])
+        self.assertEqual(len(self.cross_encoder.calls), 1)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_submits_share_one_model_call(self):
+        calls = []
+
+        def run_batch(items):
+            calls.append(list(items))
+            return [item * 10 for item in items]
+
+        # the batch fills up long before the wait window ends
+        batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=5000)
+        start = threading.Barrier(4)
+        results = {}
+
+        def request(item):
+            start.wait()
+            results[item] = batcher.submit(item).result(timeout=5)
+
+        threads = [threading.Thread(target=request, args=(item,)) for item in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(calls[0]), [0, 1, 2, 3])
+        self.assertEqual(results, {0: 0, 1: 10, 2: 20, 3: 30})
+
+
+class RoutedRetrievalTests(RetrieverTestCase):
+    def test_one_embedding_and_one_rerank_over_both_partitions(self):
+        retriever = self.open_retriever()
+        self.add_chunks(
+            *((f"t{i}", f"Atom fact {i}.", "text") for i in range(5)),
+        )
+        self.add_chunks(
+            ("tab0", "atom mass table", "table"),
+            ("tab1", "atom charge table", "table"),
+            name="physics_tables"
+        )
+        for chunk_id, row in self.collection("physics_tables").rows.items():
+            row[2]["table_ref"] = chunk_id
+        retriever.table_store.put_many(["tab0", "tab1"], ["doc1", "doc1"], ["| mass |", "| charge |"])
+
+        results = retriever.retrieve_routed("atom mass", routes={"text": 3, "table": 1}, top_k=3)
+
+        self.assertEqual(self.embedding_model.calls, [["atom mass"]])
+        self.assertEqual(len(self.cross_encoder.calls), 1)
+        # fetch_k per route: 3 text and 1 table candidates, reranked together
+        reranked = [content for _, content in self.cross_encoder.calls[0]]
+        self.assertEqual(sum(content.startswith("Atom fact") for content in reranked), 3)
+        self.assertEqual([content for content in reranked if "table" in content], ["atom mass table"])
+        # the table won and carries its markdown as content
+        self.assertEqual(results[0]["id"], "tab0")
+        self.assertEqual(results[0]["content"], "| mass |")
+        self.assertEqual(len(results), 3)
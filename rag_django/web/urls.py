@@ -1,12 +1,13 @@
 from django.urls import path
 from .views import dashboard, ask
-from .views import ingestion_status  
+from .views import ingestion_status, ingestion_events
 
 
 urlpatterns = [
     path("", dashboard, name = 'dashboard' ),
     path("ask/", ask),
     path("status/<int:job_id>/", ingestion_status),
+    path("status/<int:job_id>/events/", ingestion_events),
 ]
 
 
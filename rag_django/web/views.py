@@ -1,13 +1,16 @@
 from django.shortcuts import render
-from django.core.files.storage import FileSystemStorage
 from .tasks import ingest_folder_task
-from rag.services.services import ask_rag
+from rag.services.services import aask_rag, aask_rag_stream
 from .models import IngestionJob
+from .progress import FINISHED, get_progress_channel, job_snapshot
+from .staging import stage_uploads
 #import uuid
 from rag.services.user_index import get_or_create_user_index
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+import json
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 
 @login_required(login_url="/login/")
 def dashboard(request):
@@ -21,13 +24,6 @@ def dashboard(request):
                 "web/index.html",
                 {"error" : "Add atleast one document before indexing."}
             )
-        upload_dir = "media/uploads/"
-
-        fs = FileSystemStorage(location=upload_dir)
-
-        for f in files:
-            fs.save(f.name, f)
-
         user = request.user
         user_index = get_or_create_user_index(user)
 
@@ -41,15 +37,17 @@ def dashboard(request):
             progress=0
         )
 
-        # #  celery execution
-        # ingest_folder_task.delay(
-        #     folder_path=upload_dir,
-        #     job_id=job.id,
-        #     doc_id = user_index.collection_name
-        # )
-
-        #currently sync task
-        ingest_folder_task(
+        # every upload gets its own directory, so the task only sees the
+        # files uploaded here (see web/staging.py)
+        upload_dir = stage_uploads(user.username, job.id, files)
+        # kept on the job, so a retry or recovery can run it again
+        job.folder_path = upload_dir
+        job.collection_name = user_index.collection_name
+        job.save(update_fields=["folder_path", "collection_name", "updated_at"])
+
+        # runs on a Celery worker; the page follows its progress.
+        # CELERY_TASK_ALWAYS_EAGER=1 runs it inline instead.
+        ingest_folder_task.delay(
             folder_path=upload_dir,
             job_id=job.id,
             doc_id = user_index.collection_name
@@ -66,35 +64,109 @@ def dashboard(request):
 
 @login_required(login_url="/login/")
 @csrf_exempt
-def ask(request):
+async def ask(request):
+    # async view: under rag_django.asgi the worker is free while we wait on
+    # retrieval (offloaded to an executor) and on Gemini
     answer = None
     sources = []
+    arender = sync_to_async(render)
 
     if request.method == "POST":
         question = request.POST.get("question")
         if not question:
-            return render(request, "web/index.html",
+            return await arender(request, "web/index.html",
                           {"error": "Please enter a question according to the uploaded documents."})
-        user = request.user
-        user_index = get_or_create_user_index(user)
+        user = await request.auser()
+        user_index = await sync_to_async(get_or_create_user_index)(user)
         doc_id = user_index.collection_name
         print(f"Currently using collection as  {doc_id}")
-        response = ask_rag(question, doc_id)
+        response = await aask_rag(question, doc_id)
         answer = response["answer"]
         sources = response["sources"]
 
-    return render(request, "web/index.html", {
+    return await arender(request, "web/index.html", {
         "answer": answer,
         "sources": sources
     })
 
 
-def ingestion_status(request, job_id):
-    job = IngestionJob.objects.get(id=job_id)
-    return JsonResponse({
-        "status": job.status,
-        "progress": job.progress,
-        "message": job.message
-    })
+@login_required(login_url="/login/")
+async def ask_stream(request):
+    """
+    Server-sent events version of ask: the first frame carries the sources,
+    the following ones carry answer text as soon as Gemini produces it.
+    Async all the way down: under ASGI, Django buffers a sync iterator
+    until it is exhausted, which would hold every frame back.
+    """
+    question = request.POST.get("question") if request.method == "POST" else None
+    if not question:
+        return JsonResponse(
+            {"error": "Please enter a question according to the uploaded documents."},
+            status=400
+        )
+
+    user = await request.auser()
+    user_index = await sync_to_async(get_or_create_user_index)(user)
+    doc_id = user_index.collection_name
 
+    async def event_stream():
+        try:
+            async for event in aask_rag_stream(question, doc_id):
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def ingestion_status(request, job_id):
+    job = IngestionJob.objects.get(id=job_id)
+    return JsonResponse(job_snapshot(job))
+
+
+async def ingestion_events(request, job_id):
+    """
+    Server-sent events for an ingestion job: the current state first, then
+    every coalesced update the workers publish, until the job finishes.
+    An async generator, so ASGI sends each event as it arrives (a sync one
+    would be buffered until the job ends).
+    """
+    # an unknown job is a 404 before anything is subscribed
+    if not await IngestionJob.objects.filter(id=job_id).aexists():
+        raise Http404(f"No ingestion job {job_id}")
+
+    channel = get_progress_channel()
+    # subscribe before reading the current state so nothing falls in between
+    subscription = await sync_to_async(channel.subscribe)(job_id)
+    try:
+        job = await IngestionJob.objects.aget(id=job_id)
+    except BaseException:
+        # deleted meanwhile, or the request was cancelled: the generator
+        # that would close it never runs
+        subscription.close()
+        raise
+    # blocking reads, kept off the thread that runs the ORM calls
+    next_event = sync_to_async(subscription.get, thread_sensitive=False)
+
+    async def event_stream():
+        try:
+            event = job_snapshot(job)
+            yield f"data: {json.dumps(event)}\n\n"
+
+            while event is None or event["status"] not in FINISHED:
+                event = await next_event(timeout=15)
+                if event is None:
+                    # keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response